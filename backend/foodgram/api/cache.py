@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from recipes.models import Tag
+from recipes.models import Version
+
+RECIPE_FRAGMENT_KEY = "recipe_fragment:{}:{}"
+USER_VERSION_KEY = "user:{}"
+TAG_MAP_KEY = "tag_map:{}"
+VERSION_STEP = 0.001
+
+
+def recipe_fragment_key(recipe):
+    """Возвращает ключ кэша для общей части представления рецепта.
+    Ключ содержит дату изменения рецепта, поэтому после изменения
+    рецепта, его тегов, ингредиентов или автора любой процесс читает
+    фрагмент по новому ключу."""
+
+    return RECIPE_FRAGMENT_KEY.format(
+        recipe.pk, recipe.updated_at.timestamp()
+    )
+
+
+def get_recipe_fragments(recipes):
+    """Возвращает словарь {id рецепта: фрагмент} для найденных в кэше
+    рецептов. Выполняет одно обращение к кэшу на всю страницу."""
+
+    keys = {recipe_fragment_key(recipe): recipe.pk for recipe in recipes}
+    cached = cache.get_many(keys.keys())
+
+    return {keys[key]: fragment for key, fragment in cached.items()}
+
+
+def set_recipe_fragment(recipe, fragment):
+    """Сохраняет общую часть представления рецепта в кэш."""
+
+    cache.set(
+        recipe_fragment_key(recipe),
+        fragment,
+        settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+    )
+
+
+def get_versions(names):
+    """Возвращает версии names одним запросом в том же порядке.
+    Версия, которая еще ни разу не обновлялась, равна нулю."""
+
+    found = dict(
+        Version.objects.filter(name__in=names).values_list("name", "value")
+    )
+
+    return [found.get(name, 0.0) for name in names]
+
+
+def get_version(name):
+    """Возвращает версию таблицы или состояния в виде метки времени
+    последнего изменения."""
+
+    return get_versions([name])[0]
+
+
+def get_user_version(user_id):
+    """Возвращает версию избранного, корзины и подписок пользователя."""
+
+    return get_version(USER_VERSION_KEY.format(user_id))
+
+
+def bump_version(name):
+    """Обновляет версию в текущей транзакции одним запросом
+    INSERT ... ON CONFLICT DO UPDATE и возвращает ее. Новая версия
+    равна текущему времени, но всегда больше предыдущей, даже если часы
+    процессов расходятся."""
+
+    quote_name = connection.ops.quote_name
+    table = quote_name(Version._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, value) VALUES (%s, %s) "
+            f"ON CONFLICT (name) DO UPDATE SET value = CASE "
+            f"WHEN excluded.value > {table}.value + %s "
+            f"THEN excluded.value ELSE {table}.value + %s END "
+            f"RETURNING value",
+            [name, time.time(), VERSION_STEP, VERSION_STEP]
+        )
+
+        return cursor.fetchone()[0]
+
+
+def bump_user_version(user_id):
+    """Обновляет версию избранного, корзины и подписок пользователя."""
+
+    bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def get_tag_map():
+    """Возвращает словарь {slug: id} всех тегов. Словарь хранится
+    в кэше под ключом с версией тегов и загружается заново после
+    изменения тегов любым процессом."""
+
+    key = TAG_MAP_KEY.format(get_version("tags"))
+    tag_map = cache.get(key)
+
+    if tag_map is None:
+        tag_map = dict(Tag.objects.values_list("slug", "id"))
+        cache.set(key, tag_map, settings.VERSION_CACHE_TIMEOUT)
+
+    return tag_map
@@ -0,0 +1,135 @@
+import json
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+from users.models import User
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+ALLOWED_SEQ_SCANS = frozenset({"recipes_tag"})
+
+
+def get_endpoints(user, tag):
+    """Возвращает основные запросы к API, планы которых проверяются."""
+
+    return (
+        "/api/recipes/",
+        "/api/recipes/?pagination=cursor",
+        f"/api/recipes/?author={user.id}",
+        f"/api/recipes/?tags={tag.slug}",
+        "/api/recipes/?is_favorited=1",
+        "/api/recipes/?is_in_shopping_cart=1",
+        "/api/recipes/feed/",
+        "/api/users/subscriptions/",
+    )
+
+
+@contextmanager
+def capture_sql():
+    """Собирает пары (sql, params) запросов SELECT, выполненных
+    внутри блока."""
+
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT"):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def iter_plan_nodes(node):
+    """Обходит узлы плана PostgreSQL в формате JSON."""
+
+    yield node
+
+    for child in node.get("Plans", ()):
+        yield from iter_plan_nodes(child)
+
+
+def postgresql_seq_scans(cursor, sql, params):
+    """Возвращает таблицы, которые PostgreSQL читает полным
+    просмотром. Полный просмотр запрещается на время запроса, поэтому
+    он остается в плане только при отсутствии подходящего индекса,
+    независимо от объема данных."""
+
+    with transaction.atomic():
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return {
+        node["Relation Name"]
+        for node in iter_plan_nodes(plan[0]["Plan"])
+        if node["Node Type"] == "Seq Scan"
+    }
+
+
+def sqlite_seq_scans(cursor, sql, params):
+    """Возвращает таблицы, которые SQLite читает полным просмотром
+    без индекса."""
+
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    scans = set()
+
+    for *_, detail in cursor.fetchall():
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            scans.add(match.group(1))
+
+    return scans
+
+
+def find_seq_scans(sql, params):
+    """Возвращает таблицы запроса, прочитанные без индекса."""
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            return postgresql_seq_scans(cursor, sql, params)
+        return sqlite_seq_scans(cursor, sql, params)
+
+
+def check_endpoint(client, path, allowed=ALLOWED_SEQ_SCANS):
+    """Выполняет GET запрос path и возвращает список пар
+    (таблица, sql) для запросов, читающих таблицы без индекса."""
+
+    with capture_sql() as queries:
+        response = client.get(path)
+
+    if response.status_code != 200:
+        raise AssertionError(f"{path}: статус {response.status_code}")
+
+    return [
+        (table, sql)
+        for sql, params in queries
+        for table in sorted(find_seq_scans(sql, params) - allowed)
+    ]
+
+
+def check_endpoints(user=None, allowed=ALLOWED_SEQ_SCANS):
+    """Проверяет планы основных запросов к API от имени user.
+    Возвращает словарь {path: список пар (таблица, sql)}."""
+
+    user = user or User.objects.order_by("id").first()
+    tag = Tag.objects.order_by("id").first()
+
+    if user is None or tag is None:
+        raise AssertionError("Для проверки нужны пользователь и тег")
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    return {
+        path: check_endpoint(client, path, allowed)
+        for path in get_endpoints(user, tag)
+    }
@@ -0,0 +1,131 @@
+import binascii
+import uuid
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_base64.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LimitedBase64ImageField(Base64ImageField):
+    """Поле изображения в base64 с ограничением размера.
+    Строка декодируется частями во временный файл, размер в байтах
+    проверяется по ходу декодирования, а размер в пикселях -
+    по заголовку изображения до его полной распаковки."""
+
+    default_error_messages = {
+        "invalid_base64": "Изображение должно быть строкой data:image/...;"
+                          "base64,...",
+        "too_large": "Размер изображения превышает {max_bytes} байт.",
+        "too_many_pixels": "Размер изображения превышает {max_pixels} "
+                           "пикселей.",
+    }
+
+    def __init__(self, *args, max_bytes=None, max_pixels=None, **kwargs):
+        self.max_bytes = max_bytes or settings.RECIPE_IMAGE_MAX_BYTES
+        self.max_pixels = max_pixels or settings.RECIPE_IMAGE_MAX_PIXELS
+        super().__init__(*args, **kwargs)
+
+    def _decode(self, data):
+        """Строку data:... декодирует во временный файл и проверяет
+        его размер. Остальные значения обрабатывает drf-base64:
+        ссылка http... пропускается, файл передается дальше."""
+
+        if not isinstance(data, str) or not data.startswith("data:"):
+            return super()._decode(data)
+
+        file = self.decode(data)
+
+        try:
+            self.check_pixels(file)
+        except Exception:
+            file.close()
+            raise
+
+        return file
+
+    def to_internal_value(self, data):
+        file = self._decode(data)
+
+        try:
+            return super().to_internal_value(file)
+        except Exception:
+            if file is not data:
+                file.close()
+            raise
+
+    def decode(self, data):
+        """Декодирует base64 во временный файл частями по CHUNK_SIZE."""
+
+        start = data.find(";base64,")
+
+        if start == -1:
+            self.fail("invalid_base64")
+
+        start += len(";base64,")
+
+        # Грубая проверка до декодирования: 4 символа base64 - 3 байта.
+        if (len(data) - start) // 4 * 3 > self.max_bytes + 3:
+            self.fail("too_large", max_bytes=self.max_bytes)
+
+        file = TemporaryUploadedFile(
+            "upload", "application/octet-stream", 0, None
+        )
+        size = 0
+        tail = ""
+
+        try:
+            for offset in range(start, len(data), CHUNK_SIZE):
+                chunk = tail + "".join(
+                    data[offset:offset + CHUNK_SIZE].split()
+                )
+                cut = len(chunk) - len(chunk) % 4
+                tail = chunk[cut:]
+                decoded = binascii.a2b_base64(chunk[:cut])
+                size += len(decoded)
+
+                if size > self.max_bytes:
+                    self.fail("too_large", max_bytes=self.max_bytes)
+
+                file.write(decoded)
+
+            if tail:
+                self.fail("invalid_base64")
+        except binascii.Error:
+            file.close()
+            self.fail("invalid_base64")
+        except serializers.ValidationError:
+            file.close()
+            raise
+
+        file.size = size
+        file.seek(0)
+
+        return file
+
+    def check_pixels(self, file):
+        """Проверяет размер по заголовку и защищает от
+        decompression bomb при дальнейшей обработке Pillow."""
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", Image.DecompressionBombWarning)
+                with Image.open(file) as image:
+                    width, height = image.size
+                    image_format = image.format
+        except (Image.DecompressionBombWarning,
+                Image.DecompressionBombError):
+            self.fail("too_many_pixels", max_pixels=self.max_pixels)
+        except Exception:
+            self.fail("invalid_image")
+
+        if width * height > self.max_pixels:
+            self.fail("too_many_pixels", max_pixels=self.max_pixels)
+
+        file.name = "{}.{}".format(uuid.uuid4(), image_format.lower())
+        file.content_type = Image.MIME.get(image_format)
+        file.seek(0)
@@ -1,29 +1,80 @@
+from django.conf import settings
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models.functions import Upper
 from django_filters import rest_framework
 from rest_framework import filters
 
+from api.cache import get_tag_map
+from api.lookups import SearchMatch
+from api.lookups import SearchRank
+from api.lookups import Similarity
+from api.search import ingredient_index
+from recipes.models import Ingredient
 from recipes.models import Recipe
-from recipes.models import Tag
+
+
+def get_tag_choices():
+    """Возвращает варианты фильтра тегов из кэшированного словаря."""
+
+    return [(slug, slug) for slug in get_tag_map()]
 
 
 class RecipeFilter(rest_framework.FilterSet):
     """Класс фильтра для модели Recipe. Позволяет производить поиск рецептов
-    по тегам, автору, наличию в списке избранного и корзине покупок.
+    по тегам, автору, наличию в списке избранного и корзине покупок,
+    а также по тексту названия и описания.
     """
 
-    tags = rest_framework.filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all()
+    tags = rest_framework.filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method="tags_filter"
     )
     is_favorited = rest_framework.filters.BooleanFilter(
         method="is_favorited_filter")
     is_in_shopping_cart = rest_framework.filters.BooleanFilter(
         method="is_in_shopping_cart_filter")
+    search = rest_framework.filters.CharFilter(
+        method="search_filter")
 
     class Meta:
         model = Recipe
         fields = ("tags", "author",)
 
+    def search_filter(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию рецепта.
+        Результаты упорядочиваются по релевантности."""
+
+        value = value.strip()
+
+        if not value:
+            return queryset
+
+        return queryset.filter(
+            SearchMatch(value)
+        ).annotate(
+            search_rank=SearchRank(value)
+        ).order_by("-search_rank", "-pub_date", "-id")
+
+    def tags_filter(self, queryset, name, value):
+        """Оставляет рецепты, у которых есть хотя бы один из тегов.
+        Подзапрос Exists не размножает строки рецептов, поэтому
+        DISTINCT не нужен."""
+
+        if not value:
+            return queryset
+
+        tag_map = get_tag_map()
+
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef("pk"),
+                    tag_id__in=[tag_map[slug] for slug in value]
+                )
+            )
+        )
+
     def is_favorited_filter(self, queryset, name, value):
 
         user = self.request.user
@@ -46,3 +97,44 @@ class RecipeFilter(rest_framework.FilterSet):
 class CustomSearchFilter(filters.SearchFilter):
     """Фильтр дли ингредиентов"""
     search_param = "name"
+
+
+class IngredientSearchFilter(filters.BaseFilterBackend):
+    """Поиск ингредиентов по параметру name через индекс в памяти.
+    Возвращает ограниченный список: точное совпадение, затем по началу
+    названия, затем по подстроке.
+    С параметром match=prefix, match=contains или match=fuzzy поиск
+    выполняется в базе данных по началу названия, по подстроке или
+    по триграммному сходству."""
+
+    search_param = "name"
+    match_param = "match"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+
+        if view.action != "list" or not query:
+            return queryset
+
+        match = request.query_params.get(self.match_param)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+
+        if match == "prefix":
+            return queryset.filter(name__istartswith=query)[:limit]
+
+        if match == "contains":
+            return queryset.filter(name__icontains=query)[:limit]
+
+        if match == "fuzzy":
+            return queryset.alias(
+                upper_name=Upper("name")
+            ).filter(
+                upper_name__trigram_similar=query
+            ).annotate(
+                similarity=Similarity("name", query)
+            ).order_by("-similarity", "name")[:limit]
+
+        return [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for pk, name, measurement_unit in ingredient_index.search(query)
+        ]
@@ -0,0 +1,127 @@
+from django.db.models import BooleanField
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import Func
+from django.db.models import Lookup
+from django.db.models import Value
+from django.db.models.functions import Upper
+
+
+@Upper.register_lookup
+class TrigramSimilar(Lookup):
+    """Нечеткое совпадение UPPER(поле) с запросом. В PostgreSQL
+    использует оператор pg_trgm %, который обслуживается GIN-индексом
+    gin_trgm_ops, в остальных базах сводится к поиску подстроки."""
+
+    lookup_name = "trigram_similar"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        params = lhs_params + [
+            f"%{connection.ops.prep_for_like_query(param)}%"
+            for param in rhs_params
+        ]
+
+        return f"{lhs} LIKE UPPER({rhs}) ESCAPE '\\'", params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+
+        return f"{lhs} %% UPPER({rhs})", lhs_params + rhs_params
+
+
+class Similarity(Func):
+    """Степень сходства поля с запросом по триграммам pg_trgm.
+    В остальных базах всегда равна нулю."""
+
+    function = "SIMILARITY"
+    output_field = FloatField()
+
+    def __init__(self, expression, query, **extra):
+        super().__init__(Upper(expression), Upper(Value(query)), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return "0.0", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+class RecipeTextSearch(Func):
+    """Базовый класс полнотекстового поиска по названию и описанию
+    рецепта. В PostgreSQL использует столбец search_vector, который
+    создается миграцией и не описан в модели, в остальных базах
+    сводится к поиску подстроки."""
+
+    config = "russian"
+    vector_column = "search_vector"
+
+    def __init__(self, query, **extra):
+        super().__init__(F("name"), F("text"), Value(query), **extra)
+
+    def compile_like(self, compiler, connection):
+        """Возвращает пары (SQL, параметры) условий поиска подстроки
+        в названии и в описании."""
+
+        *columns, query = self.get_source_expressions()
+        pattern = f"%{connection.ops.prep_for_like_query(query.value)}%"
+        conditions = []
+
+        for column in columns:
+            column_sql, column_params = compiler.compile(column)
+            conditions.append((
+                f"UPPER({column_sql}) LIKE UPPER(%s) ESCAPE '\\'",
+                column_params + [pattern],
+            ))
+
+        return conditions
+
+    def compile_vector(self, compiler, connection):
+        """Возвращает SQL столбца search_vector, tsquery и параметры."""
+
+        name, _, query = self.get_source_expressions()
+        vector = ".".join((
+            compiler.quote_name_unless_alias(name.alias),
+            connection.ops.quote_name(self.vector_column),
+        ))
+
+        return vector, f"websearch_to_tsquery('{self.config}', %s)", [
+            query.value
+        ]
+
+
+class SearchMatch(RecipeTextSearch):
+    """Условие совпадения рецепта с поисковым запросом."""
+
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (name_sql, name_params), (text_sql, text_params) = (
+            self.compile_like(compiler, connection)
+        )
+
+        return f"({name_sql} OR {text_sql})", name_params + text_params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        vector, query, params = self.compile_vector(compiler, connection)
+
+        return f"{vector} @@ {query}", params
+
+
+class SearchRank(RecipeTextSearch):
+    """Релевантность рецепта запросу: ts_rank в PostgreSQL,
+    в остальных базах совпадение в названии важнее, чем в описании."""
+
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (name_sql, name_params), _ = self.compile_like(compiler, connection)
+
+        return f"CASE WHEN {name_sql} THEN 1.0 ELSE 0.5 END", name_params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        vector, query, params = self.compile_vector(compiler, connection)
+
+        return f"ts_rank({vector}, {query})", params
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+from django.db import connection
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUESTS = Counter(
+    "foodgram_requests_total",
+    "Количество запросов",
+    ["view", "method", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "foodgram_request_duration_seconds",
+    "Время обработки запроса",
+    ["view"],
+    buckets=TIME_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "foodgram_db_queries",
+    "Количество SQL запросов на запрос к API",
+    ["view"],
+    buckets=QUERY_BUCKETS
+)
+DB_DURATION = Histogram(
+    "foodgram_db_duration_seconds",
+    "Время выполнения SQL запросов на запрос к API",
+    ["view"],
+    buckets=TIME_BUCKETS
+)
+SERIALIZER_DURATION = Histogram(
+    "foodgram_serializer_duration_seconds",
+    "Время сериализации ответа",
+    ["view"],
+    buckets=TIME_BUCKETS
+)
+
+state = threading.local()
+
+
+class RequestMetrics:
+    """Показатели одного запроса, накапливаемые во время обработки."""
+
+    def __init__(self):
+        self.view = "unresolved"
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL запросов для execute_wrapper."""
+
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def get_view_name(view_func, method):
+    """Возвращает имя view для меток: для ViewSet класс и действие,
+    например RecipeViewSet.list, для остальных view имя функции."""
+
+    cls = getattr(view_func, "cls", None)
+
+    if cls is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+
+    return f"{cls.__name__}.{action}"
+
+
+class MetricsMiddleware:
+    """Записывает для каждого запроса время обработки, количество
+    и время SQL запросов и время сериализации с меткой view.
+    При заданной переменной PROMETHEUS_MULTIPROC_DIR значения хранятся
+    в файлах этого каталога и суммируются по всем процессам gunicorn."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = state.current = RequestMetrics()
+        started = time.perf_counter()
+
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            state.current = None
+
+        view = metrics.view
+        REQUEST_DURATION.labels(view).observe(time.perf_counter() - started)
+        DB_QUERIES.labels(view).observe(metrics.queries)
+        DB_DURATION.labels(view).observe(metrics.db_time)
+        SERIALIZER_DURATION.labels(view).observe(metrics.serializer_time)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state.current.view = get_view_name(view_func, request.method)
+
+
+class MeasuredSerializerMixin:
+    """Учитывает время to_representation в показателях текущего
+    запроса. Вложенные сериализаторы не учитываются повторно."""
+
+    def to_representation(self, instance):
+        metrics = getattr(state, "current", None)
+
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.serializer_depth -= 1
+
+
+def get_registry():
+    """Возвращает реестр показателей текущего процесса или реестр,
+    объединяющий показатели всех процессов."""
+
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def metrics_view(request):
+    """Отдает показатели в текстовом формате Prometheus."""
+
+    return HttpResponse(generate_latest(get_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
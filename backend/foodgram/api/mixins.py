@@ -0,0 +1,87 @@
+import hashlib
+import math
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+
+from api.cache import USER_VERSION_KEY
+from api.cache import get_versions
+
+
+class ConditionalGetMixin:
+    """Добавляет ETag и Last-Modified к ответам list/retrieve и отвечает
+    304 по If-None-Match, если данные не изменились. Состояние
+    вычисляется из версий таблиц без сериализации ответа."""
+
+    version_names = ()
+    per_user_versions = False
+
+    def get_version_names(self):
+        """Возвращает имена версий, от которых зависит ответ."""
+
+        return self.version_names
+
+    def get_versions(self):
+        """Возвращает список версий, от которых зависит ответ.
+        Все версии читаются одним запросом."""
+
+        names = list(self.get_version_names())
+        user = self.request.user
+
+        if self.per_user_versions and user.is_authenticated:
+            names.append(USER_VERSION_KEY.format(user.pk))
+
+        return get_versions(names)
+
+    def get_conditional_state(self):
+        """Возвращает пару (etag, last_modified) для текущего запроса.
+        last_modified округляется вверх до секунды."""
+
+        versions = self.get_versions()
+        user = self.request.user
+        key = "|".join(
+            [self.action, self.request.get_full_path()]
+            + [repr(version) for version in versions]
+        )
+
+        if self.per_user_versions and user.is_authenticated:
+            key = f"{key}|{user.pk}"
+
+        etag = quote_etag(hashlib.md5(key.encode("utf-8")).hexdigest())
+
+        return etag, math.ceil(max(versions)) if versions else None
+
+    def conditional_response(self, method, request, *args, **kwargs):
+        """Вызывает метод view, если клиент не имеет актуальной копии.
+        Актуальность проверяется только по ETag: Last-Modified с точностью
+        до секунды не отличает изменения в одну секунду, поэтому
+        If-Modified-Since не дает 304."""
+
+        etag, last_modified = self.get_conditional_state()
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            response = method(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+
+            if self.per_user_versions:
+                patch_vary_headers(response, ("Authorization",))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -1,6 +1,358 @@
+import base64
+import binascii
+from collections import OrderedDict
+from functools import partial
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.pagination import Cursor
+from rest_framework.pagination import CursorPagination
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from api.search import recipe_ingredient_index
+from recipes import timeline
+
+
+class RecipeCursorPaginator(CursorPagination):
+    """Курсорный пагинатор для рецептов по паре (дата публикации, id).
+    Курсор хранит пару последнего или первого рецепта страницы, поэтому
+    рецепты с одинаковой датой публикации не требуют OFFSET. Не выполняет
+    COUNT(*), скорость не зависит от глубины страницы."""
+
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+
+    def parse_position(self, position):
+        """Возвращает пару (дата публикации, id) из позиции курсора."""
+
+        try:
+            pub_date, recipe_id = position.split("|")
+            pub_date = parse_datetime(pub_date)
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return pub_date, recipe_id
+
+    def format_position(self, recipe):
+        return f"{recipe.pub_date.isoformat()}|{recipe.pk}"
+
+    def keyset_filter(self, position, reverse):
+        """Возвращает условие выборки рецептов после позиции в порядке
+        убывания (дата публикации, id) или перед ней при reverse.
+        Условие по одной дате позволяет начать просмотр индекса
+        с позиции курсора."""
+
+        pub_date, recipe_id = self.parse_position(position)
+
+        if reverse:
+            return Q(pub_date__gte=pub_date) & (
+                Q(pub_date__gt=pub_date) | Q(id__gt=recipe_id)
+            )
+
+        return Q(pub_date__lte=pub_date) & (
+            Q(pub_date__lt=pub_date) | Q(id__lt=recipe_id)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if reverse:
+            queryset = queryset.order_by("pub_date", "id")
+        else:
+            queryset = queryset.order_by("-pub_date", "-id")
+
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(
+                self.keyset_filter(self.cursor.position, reverse)
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False,
+                   position=self.format_position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True,
+                   position=self.format_position(self.page[0]))
+        )
+
+
+class UserCursorPaginator(CursorPagination):
+    """Курсорный пагинатор для пользователей и подписок по id."""
+
+    page_size_query_param = "limit"
+    ordering = ("id",)
 
 
 class CustomPaginator(PageNumberPagination):
-    """Пагинатор для определения количества элементов на странице."""
+    """Пагинатор для определения количества элементов на странице.
+    Если view задает cursor_pagination_class, а в запросе передан
+    параметр cursor или pagination=cursor, постраничный вывод
+    выполняется курсорным пагинатором. Если view задает
+    have_pagination_class, а в запросе передан параметр have,
+    вывод выполняется этим пагинатором."""
+
     page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+    cursor_mode = "cursor"
+    have_query_param = "have"
+
+    delegate = None
+
+    def is_cursor_request(self, request):
+        """Возвращает True, если клиент запросил курсорный режим."""
+
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(
+                self.mode_query_param) == self.cursor_mode
+        )
+
+    def get_delegate_class(self, request, view):
+        """Возвращает класс пагинатора, которому передается вывод,
+        или None для постраничного вывода по номеру страницы."""
+
+        have_pagination_class = getattr(view, "have_pagination_class", None)
+
+        if (
+            have_pagination_class
+            and self.have_query_param in request.query_params
+        ):
+            return have_pagination_class
+
+        cursor_pagination_class = getattr(
+            view, "cursor_pagination_class", None
+        )
+
+        if cursor_pagination_class and self.is_cursor_request(request):
+            return cursor_pagination_class
+
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        delegate_class = self.get_delegate_class(request, view)
+
+        if delegate_class:
+            self.delegate = delegate_class()
+            return self.delegate.paginate_queryset(queryset, request, view)
+
+        self.delegate = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.delegate is not None:
+            return self.delegate.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class KeysetPaginator(BasePagination):
+    """Базовый пагинатор для выборок, которые строятся вне queryset.
+    Подкласс возвращает из get_positions упорядоченные позиции страницы,
+    последний элемент позиции - id рецепта. Рецепты страницы
+    загружаются из переданного queryset одним запросом."""
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор"
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def parse_position(self, parts):
+        """Преобразует части курсора в позицию."""
+
+        raise NotImplementedError
+
+    def format_position(self, position):
+        """Преобразует позицию в список строк для курсора."""
+
+        raise NotImplementedError
+
+    def get_positions(self, queryset, request, page_size, after):
+        """Возвращает не более page_size + 1 позиций после after."""
+
+        raise NotImplementedError
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if encoded is None:
+            return None
+
+        try:
+            return self.parse_position(
+                base64.urlsafe_b64decode(
+                    encoded.encode("ascii")
+                ).decode("ascii").split("|")
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(
+            "|".join(self.format_position(position)).encode("ascii")
+        ).decode("ascii")
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        positions = self.get_positions(
+            queryset, request, page_size, self.decode_cursor(request)
+        )
+        self.next_position = (
+            positions[page_size - 1] if len(positions) > page_size else None
+        )
+        recipe_ids = [position[-1] for position in positions[:page_size]]
+        recipes = queryset.in_bulk(recipe_ids)
+
+        return [recipes[pk] for pk in recipe_ids if pk in recipes]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", None),
+            ("results", data),
+        ]))
+
+
+class FeedPaginator(KeysetPaginator):
+    """Пагинатор ленты подписок по курсору (дата публикации, id рецепта)."""
+
+    def parse_position(self, parts):
+        pub_date, recipe_id = parts
+        pub_date = parse_datetime(pub_date)
+
+        if pub_date is None:
+            raise ValueError(pub_date)
+
+        return pub_date, int(recipe_id)
+
+    def format_position(self, position):
+        pub_date, recipe_id = position
+
+        return [pub_date.isoformat(), str(recipe_id)]
+
+    def get_positions(self, queryset, request, page_size, after):
+        return timeline.get_feed(request.user.id, page_size, after)
+
+
+class HaveIngredientsPaginator(KeysetPaginator):
+    """Пагинатор поиска рецептов по имеющимся ингредиентам
+    (have=id,id,...&missing_max=N). Рецепты упорядочены по доле
+    имеющихся ингредиентов, затем по числу недостающих."""
+
+    have_query_param = "have"
+    missing_query_param = "missing_max"
+
+    def parse_position(self, parts):
+        coverage, missing, recipe_id = parts
+
+        return float(coverage), int(missing), int(recipe_id)
+
+    def format_position(self, position):
+        return [repr(value) for value in position]
+
+    def get_params(self, request):
+        """Возвращает множество id ингредиентов и допустимое число
+        недостающих ингредиентов из параметров запроса."""
+
+        try:
+            have = {
+                int(value)
+                for param in request.query_params.getlist(
+                    self.have_query_param
+                )
+                for value in param.split(",") if value.strip()
+            }
+            missing_max = int(
+                request.query_params.get(self.missing_query_param, 0)
+            )
+        except ValueError:
+            raise ValidationError({
+                self.have_query_param: "Укажите id ингредиентов через "
+                                       "запятую и целое missing_max"
+            })
+
+        return have, max(missing_max, 0)
+
+    def filter_recipe_ids(self, queryset, recipe_ids):
+        """Возвращает id из recipe_ids, которые проходят фильтры
+        queryset."""
+
+        return set(
+            queryset.filter(id__in=recipe_ids).values_list("id", flat=True)
+        )
+
+    def get_positions(self, queryset, request, page_size, after):
+        have, missing_max = self.get_params(request)
+        recipe_filter = None
+
+        if queryset.query.where:
+            recipe_filter = partial(self.filter_recipe_ids, queryset)
+
+        return recipe_ingredient_index.search(
+            have, missing_max, page_size + 1, after, recipe_filter
+        )
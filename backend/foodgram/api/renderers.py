@@ -0,0 +1,89 @@
+import csv
+import json
+
+from rest_framework import renderers
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый класс рендерера списка покупок. Помимо обычного render
+    умеет построчно отдавать список через генератор stream."""
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return self.render_errors(data)
+
+        return b"".join(self.stream(data))
+
+    def render_errors(self, data):
+        """Отображает ответ с ошибкой, например при отсутствии
+        аутентификации."""
+
+        return "\n".join(
+            f"{key}: {value}" for key, value in data.items()
+        ).encode(self.charset)
+
+    def stream(self, rows):
+        """Генератор байтов файла по строкам (name, unit, amount)."""
+
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в виде текстового файла."""
+
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, rows):
+        yield "Список покупок\n\n".encode(self.charset)
+
+        for name, unit, amount in rows:
+            yield f"{name} - {amount} {unit}.\n".encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ("name", "measurement_unit", "amount")
+        ).encode(self.charset)
+
+        for row in rows:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в формате JSON."""
+
+    media_type = "application/json"
+    format = "json"
+
+    def render_errors(self, data):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, rows):
+        separator = "["
+
+        for name, unit, amount in rows:
+            item = json.dumps(
+                {"name": name, "measurement_unit": unit, "amount": amount},
+                ensure_ascii=False
+            )
+            yield f"{separator}{item}".encode(self.charset)
+            separator = ","
+
+        yield ("[]" if separator == "[" else "]").encode(self.charset)
@@ -0,0 +1,349 @@
+import bisect
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+
+from api.cache import bump_version
+from api.cache import get_version
+from recipes.models import Ingredient
+from recipes.models import IngredientAmount
+from recipes.models import RecipeIngredientsChange
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+    Хранит отсортированный по названию в нижнем регистре массив и
+    перестраивается при изменении версии таблицы ингредиентов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.keys = []
+        self.rows = []
+
+    def build(self):
+        """Загружает ингредиенты из базы и сортирует их по названию."""
+
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit
+            in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            ).iterator()
+        )
+        self.keys = [row[0] for row in rows]
+        self.rows = [row[1:] for row in rows]
+
+    def ensure_fresh(self):
+        """Перестраивает индекс, если ингредиенты изменились."""
+
+        version = get_version("ingredients")
+
+        if self.version == version:
+            return
+
+        with self.lock:
+            if self.version != version:
+                self.build()
+                self.version = version
+
+    def search(self, query, limit=None):
+        """Возвращает строки (id, name, measurement_unit), подходящие под
+        запрос: сначала точное совпадение, затем совпадение по началу,
+        затем по подстроке. Количество результатов ограничено limit."""
+
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+
+        self.ensure_fresh()
+        query = query.strip().casefold()
+        keys, rows = self.keys, self.rows
+
+        start = bisect.bisect_left(keys, query)
+        end = start
+
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+
+        exact = [i for i in range(start, end) if keys[i] == query]
+        prefix = [i for i in range(start, end) if keys[i] != query]
+        result = (exact + prefix)[:limit]
+
+        if len(result) < limit:
+            for i, key in enumerate(keys):
+                if (start <= i < end) or query not in key:
+                    continue
+
+                result.append(i)
+
+                if len(result) == limit:
+                    break
+
+        return [rows[i] for i in result]
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс в памяти процесса: для каждого ингредиента
+    отсортированные массивы id рецептов, в которых он используется,
+    сгруппированные по числу ингредиентов рецепта. Группировка позволяет
+    не просматривать рецепты, в которых заведомо не хватает больше
+    missing_max ингредиентов.
+    В процессе, изменившем рецепт, индекс обновляется сигналами,
+    остальные процессы проверяют версию recipe_ingredients не чаще раза
+    в RECIPE_INDEX_REFRESH_INTERVAL секунд и обновляют рецепты
+    из журнала RecipeIngredientsChange. Индекс строится заново только
+    при первом обращении, после массового изменения или если журнал
+    за нужный период уже удален."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0
+        self.updates = 0
+        self.postings = {}
+        self.recipes = {}
+
+    def build(self):
+        """Загружает связи рецептов с ингредиентами одним запросом
+        и возвращает новые postings и recipes."""
+
+        rows = list(
+            IngredientAmount.objects.order_by(
+                "ingredient_id", "recipe_id"
+            ).values_list("ingredient_id", "recipe_id").iterator(
+                chunk_size=10000
+            )
+        )
+        recipes = {}
+
+        for ingredient_id, recipe_id in rows:
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+
+        postings = {}
+
+        for ingredient_id, group in groupby(rows, key=lambda row: row[0]):
+            buckets = postings[ingredient_id] = {}
+            for _, recipe_id in group:
+                buckets.setdefault(
+                    len(recipes[recipe_id]), array("q")
+                ).append(recipe_id)
+
+        return postings, {
+            recipe_id: frozenset(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+
+    def rebuild(self, version):
+        """Строит новый индекс без блокировки поиска и подменяет им
+        текущий. Если во время построения рецепты изменились в этом
+        процессе, следующая проверка не откладывается."""
+
+        updates = self.updates
+        postings, recipes = self.build()
+
+        with self.lock:
+            self.postings, self.recipes = postings, recipes
+            self.version = version
+            self.checked_at = (
+                time.monotonic() if self.updates == updates else 0
+            )
+
+    def get_changed_recipes(self, version):
+        """Возвращает id рецептов, измененных после версии индекса
+        до version, или None, если индекс нужно построить заново."""
+
+        if (self.version is None
+                or version - self.version
+                > settings.RECIPE_INDEX_CHANGES_TTL):
+            return None
+
+        recipe_ids = set(
+            RecipeIngredientsChange.objects.filter(
+                version__gt=self.version,
+                version__lte=version
+            ).values_list("recipe_id", flat=True)
+        )
+
+        if not recipe_ids or None in recipe_ids:
+            return None
+
+        return recipe_ids
+
+    def ensure_fresh(self):
+        """Обновляет индекс, если связи рецептов изменились в другом
+        процессе. Пока один поток обновляет индекс, остальные ищут
+        по прежнему."""
+
+        if (self.version is not None
+                and time.monotonic() - self.checked_at
+                < settings.RECIPE_INDEX_REFRESH_INTERVAL):
+            return
+
+        if not self.build_lock.acquire(blocking=self.version is None):
+            return
+
+        try:
+            version = get_version("recipe_ingredients")
+
+            if self.version == version:
+                self.checked_at = time.monotonic()
+                return
+
+            recipe_ids = self.get_changed_recipes(version)
+
+            if recipe_ids is None:
+                self.rebuild(version)
+                return
+
+            self.apply(load_recipe_ingredients(recipe_ids))
+
+            with self.lock:
+                self.version = version
+                self.checked_at = time.monotonic()
+        finally:
+            self.build_lock.release()
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Заменяет ингредиенты рецепта в индексе. Пустой набор
+        удаляет рецепт из индекса."""
+
+        ingredient_ids = frozenset(ingredient_ids)
+
+        with self.lock:
+            old_ids = self.recipes.pop(recipe_id, frozenset())
+
+            for ingredient_id in old_ids:
+                posting = self.postings[ingredient_id][len(old_ids)]
+                del posting[bisect.bisect_left(posting, recipe_id)]
+
+            for ingredient_id in ingredient_ids:
+                posting = self.postings.setdefault(
+                    ingredient_id, {}
+                ).setdefault(len(ingredient_ids), array("q"))
+                posting.insert(bisect.bisect_left(posting, recipe_id),
+                               recipe_id)
+
+            if ingredient_ids:
+                self.recipes[recipe_id] = ingredient_ids
+
+    def apply(self, ingredients):
+        """Заменяет ингредиенты рецептов {id рецепта: id ингредиентов}."""
+
+        with self.lock:
+            for recipe_id, ingredient_ids in ingredients.items():
+                self.update_recipe(recipe_id, ingredient_ids)
+
+            self.updates += 1
+
+    def update_recipes(self, recipe_ids):
+        """Обновляет рецепты в индексе этого процесса и записывает
+        их в журнал для остальных процессов."""
+
+        self.apply(load_recipe_ingredients(recipe_ids))
+        log_recipe_changes(recipe_ids)
+
+    def search(self, have, missing_max, limit, after=None,
+               recipe_filter=None):
+        """Возвращает не более limit позиций (доля имеющихся
+        ингредиентов, число недостающих, id рецепта) для рецептов,
+        в которых есть хотя бы один ингредиент из have и не хватает
+        не более missing_max. Позиции упорядочены по убыванию доли,
+        затем по числу недостающих и по убыванию id. after - позиция,
+        после которой начинается страница, recipe_filter - функция,
+        возвращающая допустимые рецепты из списка id."""
+
+        self.ensure_fresh()
+        max_size = len(have) + missing_max
+        counts = {}
+
+        with self.lock:
+            for ingredient_id in have:
+                for size, posting in self.postings.get(
+                    ingredient_id, {}
+                ).items():
+                    if size <= max_size:
+                        counts.setdefault(size, Counter()).update(posting)
+
+        keys = [
+            (-matched / size, size - matched, -recipe_id)
+            for size, size_counts in counts.items()
+            for recipe_id, matched in size_counts.items()
+            if size - matched <= missing_max
+        ]
+
+        if after is not None:
+            coverage, missing, recipe_id = after
+            after_key = (-coverage, missing, -recipe_id)
+            keys = [key for key in keys if key > after_key]
+
+        if recipe_filter is None:
+            keys = heapq.nsmallest(limit, keys)
+        else:
+            keys = filter_keys(sorted(keys), limit, recipe_filter)
+
+        return [
+            (-coverage, missing, -recipe_id)
+            for coverage, missing, recipe_id in keys
+        ]
+
+
+def filter_keys(keys, limit, recipe_filter):
+    """Возвращает первые limit позиций keys, рецепты которых
+    пропускает recipe_filter. Фильтр вызывается для частей keys,
+    размер которых растет вдвое, пока не набрано limit позиций."""
+
+    result = []
+    start = 0
+    size = limit
+
+    while start < len(keys) and len(result) < limit:
+        chunk = keys[start:start + size]
+        allowed = recipe_filter([-key[2] for key in chunk])
+        result.extend(key for key in chunk if -key[2] in allowed)
+        start += size
+        size *= 2
+
+    return result[:limit]
+
+
+def load_recipe_ingredients(recipe_ids):
+    """Возвращает ингредиенты рецептов {id рецепта: [id ингредиентов]}
+    одним запросом. Удаленным рецептам соответствует пустой список."""
+
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+
+    for recipe_id, ingredient_id in IngredientAmount.objects.filter(
+        recipe_id__in=ingredients
+    ).values_list("recipe_id", "ingredient_id"):
+        ingredients[recipe_id].append(ingredient_id)
+
+    return ingredients
+
+
+@transaction.atomic
+def log_recipe_changes(recipe_ids=None):
+    """Обновляет версию recipe_ingredients и записывает измененные
+    рецепты в журнал в одной транзакции. Без recipe_ids записывается
+    изменение всех рецептов. Записи старше RECIPE_INDEX_CHANGES_TTL
+    удаляются."""
+
+    version = bump_version("recipe_ingredients")
+    RecipeIngredientsChange.objects.bulk_create(
+        [RecipeIngredientsChange(recipe_id=recipe_id, version=version)
+         for recipe_id in (recipe_ids or [None])],
+        batch_size=1000
+    )
+    RecipeIngredientsChange.objects.filter(
+        version__lt=version - settings.RECIPE_INDEX_CHANGES_TTL
+    ).delete()
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
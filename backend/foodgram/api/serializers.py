@@ -1,7 +1,17 @@
+from collections import OrderedDict
+
 from django.db import transaction
+from django.db.models import Manager
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.cache import get_recipe_fragments
+from api.cache import set_recipe_fragment
+from api.fields import LimitedBase64ImageField
+from api.metrics import MeasuredSerializerMixin
+from recipes import images
+from recipes import shopping_list
+from recipes.images import get_variant_urls
 from recipes.models import Ingredient
 from recipes.models import IngredientAmount
 from recipes.models import Recipe
@@ -9,7 +19,8 @@ from recipes.models import Tag
 from users.serializers import UserGetSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(MeasuredSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор модели Ingredient для всех полей."""
 
     class Meta:
@@ -17,7 +28,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Сериализатор модели Tag для всех полей."""
 
     class Meta:
@@ -48,8 +59,21 @@ class IngredientAmountGETSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
-    """Сериализатор для получения рецепта."""
+class RecipeListSerializer(MeasuredSerializerMixin,
+                           serializers.ListSerializer):
+    """Список рецептов. Общие фрагменты всех рецептов страницы
+    читаются из кэша одним обращением."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        self.child.fragments = get_recipe_fragments(recipes)
+
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Общая для всех пользователей часть представления рецепта:
+    автор, теги, ингредиенты, изображение и описание."""
 
     author = UserGetSerializer(
         read_only=True
@@ -63,31 +87,153 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         read_only=True,
         source="recipes"
     )
+    image = Base64ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            "id",
+            "author",
+            "tags",
+            "ingredients",
+            "image",
+            "image_variants",
+            "name",
+            "text",
+            "cooking_time",
+            "pub_date"
+        )
+
+    def get_image_variants(self, obj):
+        """Возвращает ссылки на уменьшенные копии изображения
+        в виде {размер: {формат: url}}."""
+
+        return get_variant_urls(obj.image_variants)
+
+
+class RecipeGetSerializer(MeasuredSerializerMixin, RecipeFragmentSerializer):
+    """Сериализатор для получения рецепта. Общая часть берется из кэша,
+    поверх нее добавляются поля, зависящие от пользователя."""
+
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(read_only=True)
 
     class Meta:
         model = Recipe
-        fields = "__all__"
+        fields = (
+            "id",
+            "author",
+            "tags",
+            "ingredients",
+            "image",
+            "image_variants",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "name",
+            "text",
+            "cooking_time",
+            "pub_date"
+        )
+        list_serializer_class = RecipeListSerializer
+
+    def get_fragment(self, instance):
+        """Возвращает общую часть представления рецепта из кэша,
+        при отсутствии рендерит и сохраняет ее."""
+
+        fragment = getattr(self, "fragments", {}).get(instance.pk)
+
+        if fragment is None:
+            fragment = RecipeFragmentSerializer(instance).data
+            set_recipe_fragment(instance, fragment)
+
+        return fragment
+
+    def to_representation(self, instance):
+        fragment = self.get_fragment(instance)
+        request = self.context.get("request")
+
+        data = OrderedDict(
+            (name, fragment.get(name)) for name in self.fields
+        )
+        data["author"] = OrderedDict(
+            fragment["author"],
+            is_subscribed=self.get_is_author_subscribed(instance)
+        )
+        data["is_favorited"] = self.get_is_favorited(instance)
+        data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(instance)
+
+        if request and data["image"]:
+            data["image"] = request.build_absolute_uri(data["image"])
+
+        if request:
+            data["image_variants"] = {
+                size: {
+                    image_format: request.build_absolute_uri(url)
+                    for image_format, url in formats.items()
+                }
+                for size, formats in fragment["image_variants"].items()
+            }
+
+        return data
+
+    def _get_user(self):
+        """Возвращает аутентифицированного пользователя запроса или None."""
+
+        request = self.context.get("request")
+
+        if request and request.user.is_authenticated:
+            return request.user
+
+        return None
+
+    def get_is_author_subscribed(self, obj):
+        """Возвращает True, если пользователь подписан на автора рецепта,
+        иначе False. Использует аннотацию queryset, если она есть."""
+
+        if hasattr(obj, "is_author_subscribed"):
+            return obj.is_author_subscribed
+
+        return obj.author_id in self.context.get("subscriptions", set())
 
     def get_is_favorited(self, obj):
         """Возвращает True, если рецепт в избранном у пользователя,
-        иначе False."""
+        иначе False. Использует аннотацию queryset, если она есть."""
+
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
 
-        if "favorites" in self.context:
-            return obj.id in self.context["favorites"]
+        user = self._get_user()
 
-        return False
+        if user is None:
+            return False
+
+        return obj.favorite_recipe.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         """Возвращает True, если рецепт в списке покупок у пользователя,
-        иначе False."""
+        иначе False. Использует аннотацию queryset, если она есть."""
+
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
+
+        user = self._get_user()
 
-        if "shopping_cart" in self.context:
-            return obj.id in self.context["shopping_cart"]
+        if user is None:
+            return False
 
-        return False
+        return obj.shopping_recipe.filter(user=user).exists()
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления в избранное
+    или список покупок и удаления из них."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -103,7 +249,8 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(MeasuredSerializerMixin,
+                             serializers.ModelSerializer):
     """Сереализатор создания, удаления и обновления рецепта"""
 
     tags = serializers.PrimaryKeyRelatedField(
@@ -117,7 +264,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         many=True
     )
-    image = Base64ImageField()
+    image = LimitedBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -132,6 +279,32 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             "author"
         )
 
+    def validate_ingredients(self, value):
+        """Проверяет, что ингредиенты не повторяются и существуют.
+        Ингредиенты загружаются одним запросом и сохраняются
+        в поле ingredient каждого элемента."""
+
+        ids = [item["id"] for item in value]
+        duplicates = sorted({pk for pk in ids if ids.count(pk) > 1})
+
+        if duplicates:
+            raise serializers.ValidationError(
+                f"Ингредиенты указаны повторно: {duplicates}"
+            )
+
+        ingredients = Ingredient.objects.in_bulk(ids)
+        unknown = [pk for pk in ids if pk not in ingredients]
+
+        if unknown:
+            raise serializers.ValidationError(
+                f"Ингредиенты не найдены: {unknown}"
+            )
+
+        for item in value:
+            item["ingredient"] = ingredients[item["id"]]
+
+        return value
+
     def validate(self, obj):
 
         if not obj.get("tags"):
@@ -154,11 +327,50 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         IngredientAmount.objects.bulk_create(
             [IngredientAmount(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient["id"]),
+                ingredient=ingredient["ingredient"],
                 amount=ingredient["amount"]
             ) for ingredient in ingredients]
         )
 
+    @transaction.atomic
+    def ingredients_update(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к списку ingredients, выполняя
+        только необходимые вставки, обновления и удаления. Возвращает
+        старые и новые количества {id ингредиента: количество}."""
+
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=recipe)
+        }
+        old_amounts = {pk: amount.amount for pk, amount in current.items()}
+        new_amounts = {item["id"]: item["amount"] for item in ingredients}
+
+        removed = old_amounts.keys() - new_amounts.keys()
+        changed = []
+
+        for pk, amount in new_amounts.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ["amount"])
+
+        IngredientAmount.objects.bulk_create(
+            [IngredientAmount(
+                recipe=recipe,
+                ingredient=item["ingredient"],
+                amount=item["amount"]
+            ) for item in ingredients if item["id"] not in current]
+        )
+
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def create(self, validated_data):
         """Создает новый объект рецепта."""
@@ -169,11 +381,13 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=self.context["request"].user,
                                        **validated_data)
         self.tags_and_ingredients_set(recipe, tags, ingredients)
+        images.schedule_variants(recipe.id)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет существующий объект рецепта."""
+        """Обновляет существующий объект рецепта. Теги и ингредиенты
+        изменяются только в той части, которая отличается от текущей."""
 
         instance.image = validated_data.get("image", instance.image)
         instance.name = validated_data.get("name", instance.name)
@@ -185,15 +399,29 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
 
-        IngredientAmount.objects.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()).delete()
-
-        self.tags_and_ingredients_set(instance, tags, ingredients)
+        instance.tags.set(tags)
+        old_amounts, new_amounts = self.ingredients_update(
+            instance,
+            ingredients
+        )
         instance.save()
+        shopping_list.change_recipe(instance.id, old_amounts, new_amounts)
+
+        if "image" in validated_data:
+            images.schedule_variants(instance.id)
 
         return instance
 
+    def save(self, **kwargs):
+        """Сохраняет рецепт и закрывает временный файл изображения."""
+
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get("image")
+            if image is not None:
+                image.close()
+
     def to_representation(self, instance):
         return RecipeGetSerializer(instance,
                                    context=self.context).data
@@ -0,0 +1,161 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import bump_version
+from api.search import recipe_ingredient_index
+from recipes import shopping_list
+from recipes.ingredient_amounts import recipe_ingredients_changed
+from recipes.models import Ingredient
+from recipes.models import IngredientAmount
+from recipes.models import Recipe
+from recipes.models import Tag
+from users.models import User
+
+AUTHOR_FIELDS = frozenset(
+    ("email", "username", "first_name", "last_name")
+)
+
+pending = threading.local()
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет дату изменения рецептов и версию списка рецептов.
+    Дата изменения входит в ключ кэша фрагмента рецепта, поэтому
+    устаревший фрагмент больше не читается ни одним процессом.
+    recipe_ids может быть списком или подзапросом."""
+
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    bump_version("recipes")
+
+
+def flush_changed_recipes():
+    """Обрабатывает рецепты, накопленные changed_recipes."""
+
+    touch = pending.__dict__.pop("touch", None)
+    reindex = pending.__dict__.pop("reindex", None)
+    bump = pending.__dict__.pop("bump", False)
+
+    if touch:
+        touch_recipes(list(touch))
+    elif bump:
+        bump_version("recipes")
+    if reindex:
+        recipe_ingredient_index.update_recipes(reindex)
+
+
+def changed_recipes(recipe_ids, touch=True, reindex=False):
+    """Запоминает рецепты, измененные в текущей транзакции. После ее
+    фиксации дата изменения всех рецептов обновляется одним запросом,
+    а индекс ингредиентов одним запросом на все рецепты. Версия списка
+    рецептов обновляется один раз и вне транзакции, поэтому строка
+    версии не блокируется до ее фиксации. Рецепты из откатившейся
+    транзакции обрабатываются при следующей фиксации в этом потоке."""
+
+    pending.bump = True
+
+    if touch:
+        pending.__dict__.setdefault("touch", set()).update(recipe_ids)
+    if reindex:
+        pending.__dict__.setdefault("reindex", set()).update(recipe_ids)
+
+    transaction.on_commit(flush_changed_recipes)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, update_fields=None, **kwargs):
+    """Обновляет версию списка рецептов при изменении или удалении
+    рецепта. Ингредиенты рецепта записываются до сохранения рецепта,
+    поэтому индекс ингредиентов обновляется здесь же, а дата изменения
+    рецепта уже записана сохранением."""
+
+    if not update_fields:
+        pending.__dict__.get("touch", set()).discard(instance.pk)
+
+    changed_recipes([instance.pk], touch=False, reindex=not update_fields)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Убирает ингредиенты удаляемого рецепта из сводных списков
+    покупок, пока связи рецепта еще существуют."""
+
+    shopping_list.delete_recipe(instance.pk)
+
+
+@receiver(recipe_ingredients_changed)
+def ingredient_amounts_changed(sender, recipe_ids, **kwargs):
+    """Сбрасывает кэш рецептов при изменении их ингредиентов через
+    recipes.ingredient_amounts. Сигналы модели IngredientAmount
+    не используются, чтобы Django удалял ингредиенты одним запросом:
+    API и импорт после изменения ингредиентов сохраняют рецепт или
+    обновляют версии сами."""
+
+    changed_recipes(recipe_ids, reindex=True)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш рецептов при изменении связи рецепт-тег."""
+
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        changed_recipes([instance.pk])
+    elif pk_set:
+        touch_recipes(pk_set)
+    else:
+        touch_recipes(instance.recipe_set.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Обновляет дату изменения всех рецептов с измененным тегом."""
+
+    touch_recipes(
+        Recipe.tags.through.objects.filter(
+            tag_id=instance.pk
+        ).values("recipe_id")
+    )
+    bump_version("tags")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, created=False, **kwargs):
+    """Обновляет дату изменения всех рецептов с измененным
+    ингредиентом."""
+
+    bump_version("ingredients")
+
+    if created:
+        return
+
+    touch_recipes(
+        IngredientAmount.objects.filter(
+            ingredient_id=instance.pk
+        ).values("recipe_id")
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Обновляет дату изменения рецептов автора при изменении
+    его профиля."""
+
+    if created or (update_fields and not AUTHOR_FIELDS & update_fields):
+        return
+
+    touch_recipes(instance.recipes.values("id"))
+    bump_version("authors")
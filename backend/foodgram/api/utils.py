@@ -0,0 +1,158 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Prefetch
+from django.db.models import Subquery
+from django.db.models import Window
+from django.db.models import prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.db.models.functions import RowNumber
+
+from recipes.models import Recipe
+
+# Ограничение количества параметров запроса в PostgreSQL. Для SQLite
+# меньшее ограничение возвращает bulk_batch_size.
+MAX_QUERY_PARAMS = 65535
+
+
+def insert_ignore(model, **values):
+    """Вставляет строку модели одним запросом
+    INSERT ... ON CONFLICT DO NOTHING. Возвращает True, если строка
+    добавлена, и False, если она уже существовала."""
+
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ", ".join(quote_name(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    instance = model(**values)
+    params = [
+        field.get_db_prep_save(getattr(instance, field.attname), connection)
+        for field in fields
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES ({placeholders}) ON CONFLICT DO NOTHING",
+            params
+        )
+
+        return cursor.rowcount == 1
+
+
+def bulk_insert_ignore(model, rows, returning):
+    """Вставляет строки rows (список словарей с одинаковыми ключами)
+    запросами INSERT ... ON CONFLICT DO NOTHING RETURNING, разбивая их
+    на пачки по ограничению количества параметров запроса.
+    Возвращает значения поля returning только для вставленных строк,
+    поэтому параллельная вставка тех же строк в них не попадет."""
+
+    if not rows:
+        return []
+
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    columns = ", ".join(quote_name(field.column) for field in fields)
+    column = quote_name(model._meta.get_field(returning).column)
+    batch_size = max(1, min(
+        connection.ops.bulk_batch_size(fields, rows),
+        MAX_QUERY_PARAMS // len(fields)
+    ))
+    inserted = []
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ", ".join(
+                ["(" + ", ".join(["%s"] * len(fields)) + ")"] * len(batch)
+            )
+            params = [
+                field.get_db_prep_save(row[field.name], connection)
+                for row in batch
+                for field in fields
+            ]
+            cursor.execute(
+                f"INSERT INTO {quote_name(model._meta.db_table)} "
+                f"({columns}) VALUES {placeholders} "
+                f"ON CONFLICT DO NOTHING RETURNING {column}",
+                params
+            )
+            inserted.extend(row[0] for row in cursor.fetchall())
+
+    return inserted
+
+
+def delete_returning(queryset, returning):
+    """Удаляет строки queryset одним запросом DELETE ... RETURNING без
+    сигналов и каскадов. Возвращает значения поля returning удаленных
+    строк. queryset должен фильтровать только по полям своей таблицы."""
+
+    model = queryset.model
+    quote_name = connection.ops.quote_name
+    compiler = queryset.query.get_compiler(connection=connection)
+
+    try:
+        where, params = compiler.compile(queryset.query.where)
+    except EmptyResultSet:
+        return []
+
+    column = quote_name(model._meta.get_field(returning).column)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(model._meta.db_table)} "
+            f"WHERE {where} RETURNING {column}",
+            params
+        )
+
+        return [row[0] for row in cursor.fetchall()]
+
+
+def prefetch_latest_recipes(authors, limit=None, to_attr="latest_recipes"):
+    """Подгружает авторам из authors их последние рецепты одним запросом.
+    При заданном limit отбирает не более limit рецептов на автора с
+    помощью ROW_NUMBER() OVER (PARTITION BY author ORDER BY pub_date DESC).
+    Рецепты сохраняются в атрибут to_attr каждого автора."""
+
+    recipes = Recipe.objects.order_by("-pub_date", "-id")
+
+    if limit is not None:
+        ranked = Recipe.objects.filter(
+            author__in=authors
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F("author_id")],
+                order_by=[F("pub_date").desc(), F("id").desc()]
+            )
+        ).values("id", "row_number")
+        sql, params = ranked.query.sql_with_params()
+        recipes = recipes.filter(pk__in=RawSQL(
+            f"SELECT ranked.id FROM ({sql}) ranked "
+            f"WHERE ranked.row_number <= %s",
+            (*params, limit)
+        ))
+
+    prefetch_related_objects(
+        authors,
+        Prefetch("recipes", queryset=recipes, to_attr=to_attr)
+    )
+
+
+def count_subquery(queryset, field):
+    """Возвращает подзапрос количества строк queryset,
+    связанных с внешней строкой через field."""
+
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0
+    )
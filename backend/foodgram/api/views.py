@@ -1,7 +1,11 @@
-import io
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Prefetch
+from django.http import Http404
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
@@ -11,24 +15,41 @@ from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from api.filters import CustomSearchFilter
+from api.cache import bump_user_version
+from api.filters import IngredientSearchFilter
 from api.filters import RecipeFilter
+from api.mixins import ConditionalGetMixin
 from api.pagination import CustomPaginator
+from api.pagination import FeedPaginator
+from api.pagination import HaveIngredientsPaginator
+from api.pagination import RecipeCursorPaginator
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import ShoppingListCSVRenderer
+from api.renderers import ShoppingListJSONRenderer
+from api.renderers import ShoppingListTextRenderer
 from api.serializers import IngredientSerializer
 from api.serializers import RecipeCreateSerializer
 from api.serializers import RecipeGetSerializer
+from api.serializers import RecipeIdsSerializer
 from api.serializers import TagSerializer
+from api.utils import bulk_insert_ignore
+from api.utils import delete_returning
+from api.utils import insert_ignore
+from recipes import shopping_list
+from recipes import timeline
 from recipes.models import Favorite
 from recipes.models import Ingredient
 from recipes.models import IngredientAmount
 from recipes.models import Recipe
 from recipes.models import ShoppingCart
+from recipes.models import ShoppingListItem
 from recipes.models import Tag
+from users.models import Subscribe
+from users.models import User
 from users.serializers import CustomRecipeSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для модели Tag.
     Предоставляет возможности получения списка
     и детальной информации об тегов"""
@@ -37,9 +58,10 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    version_names = ("tags",)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для модели Ingredient.
     Предоставляет возможности получения списка
     и детальной информации об ингредиентах."""
@@ -48,11 +70,11 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny, )
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (CustomSearchFilter,)
-    search_fields = ("^name",)
+    filter_backends = (IngredientSearchFilter,)
+    version_names = ("ingredients",)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet для модели Recipe. Предоставляет возможности просмотра,
     создания, изменения и удаления рецептов.
     Также позволяет добавлять рецепты в избранное, список покупок,
@@ -61,42 +83,133 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
     pagination_class = CustomPaginator
+    cursor_pagination_class = RecipeCursorPaginator
+    have_pagination_class = HaveIngredientsPaginator
     permission_classes = (IsAuthorOrReadOnly, )
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    version_names = ("recipes", "tags", "ingredients", "authors")
+    per_user_versions = True
 
     def get_serializer_class(self):
         """Определяет сериализатор, используемый для конкретного метода."""
 
-        if self.action in ("list", "retrieve"):
+        if self.action in ("list", "retrieve", "feed"):
             return RecipeGetSerializer
 
         return RecipeCreateSerializer
 
-    def get_serializer_context(self):
-        """Определяет контекст сериализатора, включая список избранных
-        рецептов и список рецептов в корзине покупок для аутентифицированных
-        пользователей. Если пользователь не аутентифицирован, контекст не
-        изменяется.
-        """
+    def perform_create(self, serializer):
+        """Создает рецепт, увеличивает счетчик рецептов автора
+        и ставит рецепт в очередь на добавление в ленты подписчиков."""
+
+        with transaction.atomic():
+            serializer.save()
+            User.objects.filter(pk=self.request.user.pk).update(
+                recipes_count=F("recipes_count") + 1
+            )
+            timeline.schedule_fan_out(serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        """Удаляет рецепт и уменьшает счетчик рецептов автора."""
 
-        context = super().get_serializer_context()
-        request = self.request
+        with transaction.atomic():
+            author_id = instance.author_id
+            instance.delete()
+            User.objects.filter(pk=author_id).update(
+                recipes_count=F("recipes_count") - 1
+            )
+
+    def get_version_names(self):
+        """Отдельный рецепт не зависит от изменений других рецептов."""
 
-        if request and request.user.is_authenticated:
-            favorites = set(
-                Favorite.objects.filter(user=self.request.user)
-                .values_list("recipe_id", flat=True)
+        if self.action == "retrieve":
+            return tuple(
+                name for name in self.version_names if name != "recipes"
             )
-            context.update({"favorites": favorites})
 
-            shopping_cart = set(
-                ShoppingCart.objects.filter(user=self.request.user)
-                .values_list("recipe_id", flat=True)
+        return super().get_version_names()
+
+    def get_versions(self):
+        """Для отдельного рецепта добавляет дату его изменения.
+        Некорректный id рецепта дает 404, как и при получении рецепта."""
+
+        versions = super().get_versions()
+
+        if self.action == "retrieve":
+            try:
+                pk = Recipe._meta.pk.to_python(self.kwargs["pk"])
+            except ValidationError:
+                raise Http404
+            updated_at = Recipe.objects.filter(
+                pk=pk
+            ).values_list("updated_at", flat=True).first()
+
+            if updated_at is not None:
+                versions.append(updated_at.timestamp())
+
+        return versions
+
+    def get_queryset(self):
+        """Определяет queryset для конкретного метода. Для получения
+        рецептов заранее подгружает автора, теги и ингредиенты, чтобы
+        количество запросов не зависело от размера страницы.
+        Для аутентифицированного пользователя добавляет признаки
+        is_favorited, is_in_shopping_cart и подписки на автора
+        подзапросами Exists, которые вычисляются только для рецептов
+        текущей страницы."""
+
+        queryset = super().get_queryset()
+        user = self.request.user
+
+        if self.action not in ("list", "retrieve", "feed"):
+            return queryset
+
+        queryset = queryset.select_related("author").prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.all()),
+            Prefetch(
+                "recipes",
+                queryset=IngredientAmount.objects.select_related(
+                    "ingredient"
+                )
             )
-            context.update({"shopping_cart": shopping_cart})
+        )
+
+        if not user.is_authenticated:
+            return queryset
+
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(
+                    user=user,
+                    recipe=OuterRef("pk")
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=OuterRef("pk")
+                )
+            ),
+            is_author_subscribed=Exists(
+                Subscribe.objects.filter(
+                    user=user,
+                    author=OuterRef("author")
+                )
+            )
+        )
 
-        return context
+    @action(detail=False, methods=["get"],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPaginator)
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым."""
+
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["post", "delete"],
             permission_classes=(IsAuthenticated,),
@@ -106,31 +219,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Метод для добавления/удаления рецепта
         в список избранного у пользователя."""
 
-        recipe = get_object_or_404(Recipe, id=kwargs["pk"])
         user = request.user
 
         if request.method == "POST":
+            recipe = get_object_or_404(Recipe, id=kwargs["pk"])
 
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {"errors": "Рецепт уже добавлен в избранное"},
-                    status=status.HTTP_400_BAD_REQUEST
+            with transaction.atomic():
+                if not insert_ignore(Favorite, user=user, recipe=recipe):
+                    return Response(
+                        {"errors": "Рецепт уже добавлен в избранное"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    favorites_count=F("favorites_count") + 1
                 )
 
-            favorite = Favorite.objects.create(
-                user=user,
-                recipe=recipe
-            )
-            serializer = CustomRecipeSerializer(favorite.recipe)
+            bump_user_version(user.id)
+            serializer = CustomRecipeSerializer(recipe)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == "DELETE":
-            get_object_or_404(
-                Favorite,
-                user=user,
-                recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted, _ = Favorite.objects.filter(
+                    user=user,
+                    recipe_id=kwargs["pk"]
+                ).delete()
+
+                if not deleted:
+                    raise Http404
+
+                Recipe.objects.filter(pk=kwargs["pk"]).update(
+                    favorites_count=F("favorites_count") - 1
+                )
+
+            bump_user_version(user.id)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -143,68 +267,158 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, **kwargs):
         """Позволяет добавлять и удалять рецепты в список покупок."""
 
-        recipe = get_object_or_404(Recipe, id=kwargs["pk"])
         user = request.user
 
         if request.method == "POST":
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {"errors": "Рецепт уже в списке покупок."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            recipe = get_object_or_404(Recipe, id=kwargs["pk"])
 
-            cart = ShoppingCart.objects.create(
-                user=user,
-                recipe=recipe
-            )
-            serializer = CustomRecipeSerializer(cart.recipe)
+            with transaction.atomic():
+                if not insert_ignore(ShoppingCart, user=user, recipe=recipe):
+                    return Response(
+                        {"errors": "Рецепт уже в списке покупок."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                shopping_list.add_recipe(user.id, recipe.id)
+
+            bump_user_version(user.id)
+            serializer = CustomRecipeSerializer(recipe)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == "DELETE":
-            get_object_or_404(
-                ShoppingCart,
-                user=user,
-                recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted, _ = ShoppingCart.objects.filter(
+                    user=user,
+                    recipe_id=kwargs["pk"]
+                ).delete()
+
+                if not deleted:
+                    raise Http404
+
+                shopping_list.remove_recipe(user.id, kwargs["pk"])
+
+            bump_user_version(user.id)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    def bulk_change(self, request, model):
+        """Добавляет или удаляет связь пользователя с несколькими
+        рецептами модели model. Вставка и удаление выполняются одним
+        запросом с RETURNING, поэтому список измененных рецептов
+        содержит только строки, действительно измененные этим запросом,
+        даже при параллельных запросах. Возвращает результат для
+        каждого id и список измененных рецептов."""
+
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = request.user
+        recipe_ids = list(dict.fromkeys(serializer.validated_data["recipes"]))
+        existing = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                "id", flat=True
+            )
+        )
+
+        if request.method == "POST":
+            changed = bulk_insert_ignore(
+                model,
+                [{"user": user.id, "recipe": pk}
+                 for pk in recipe_ids if pk in existing],
+                "recipe"
+            )
+            statuses = ("created", "exists")
+        else:
+            changed = delete_returning(
+                model.objects.filter(user=user, recipe_id__in=existing),
+                "recipe"
+            )
+            statuses = ("deleted", "not_found")
+
+        bump_user_version(user.id)
+        changed_ids = set(changed)
+        results = [
+            {"id": pk,
+             "status": (
+                 statuses[0] if pk in changed_ids
+                 else statuses[1] if pk in existing
+                 else "not_found"
+             )}
+            for pk in recipe_ids
+        ]
+
+        return results, changed
+
+    @action(detail=False, methods=["post", "delete"],
+            permission_classes=(IsAuthenticated,),
+            url_path="favorite",
+            url_name="favorite_bulk")
+    def favorite_bulk(self, request):
+        """Добавляет в избранное или удаляет из него несколько рецептов
+        за один запрос. Принимает {"recipes": [id, ...]}."""
+
+        with transaction.atomic():
+            results, changed = self.bulk_change(request, Favorite)
+            Recipe.objects.filter(pk__in=changed).update(
+                favorites_count=F("favorites_count") + (
+                    1 if request.method == "POST" else -1
+                )
+            )
+
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post", "delete"],
+            permission_classes=(IsAuthenticated,),
+            url_path="shopping_cart",
+            url_name="shopping_cart_bulk")
+    def shopping_cart_bulk(self, request):
+        """Добавляет в список покупок или удаляет из него несколько
+        рецептов за один запрос. Принимает {"recipes": [id, ...]}."""
+
+        with transaction.atomic():
+            results, changed = self.bulk_change(request, ShoppingCart)
+
+            if request.method == "POST":
+                shopping_list.add_recipes(request.user.id, changed)
+            else:
+                shopping_list.remove_recipes(request.user.id, changed)
+
+        return Response(results, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=["get"],
             permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingListTextRenderer,
+                              ShoppingListCSVRenderer,
+                              ShoppingListJSONRenderer),
             url_path="download_shopping_cart",
             url_name="download_shopping_cart")
     def download_shopping_cart(self, request, **kwargs):
-        """Позволяет скачивать список покупок в виде текстового файла."""
+        """Позволяет скачивать список покупок. Формат выбирается
+        параметром format=txt|csv|json или заголовком Accept, файл
+        отдается потоком по мере чтения строк сводного списка покупок."""
 
         ingredients = (
-            IngredientAmount.objects
-            .filter(recipe__shopping_recipe__user=request.user)
-            .values("ingredient__name")
-            .annotate(total_amount=Sum("amount"))
+            ShoppingListItem.objects
+            .filter(user=request.user)
             .values_list(
                 "ingredient__name",
-                "total_amount",
-                "ingredient__measurement_unit"
+                "ingredient__measurement_unit",
+                "total_amount"
             )
+            .order_by("ingredient__name")
+            .iterator()
         )
 
-        buffer = io.BytesIO()
-
-        with buffer:
-            buffer.write("Список покупок\n\n".encode("utf-8"))
-
-            for name, amount, unit in ingredients:
-                buffer.write(f"{name} - {amount} {unit}.\n".encode("utf-8"))
-
-            buffer.seek(0)
-            response = HttpResponse(
-                buffer.getvalue(),
-                content_type="text/plain"
-            )
-            response[
-                "Content-Disposition"] = "attachment; filename=shopping.txt"
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}"
+        )
+        response["Content-Disposition"] = (
+            f"attachment; filename=shopping.{renderer.format}"
+        )
 
-            return response
+        return response
@@ -0,0 +1,256 @@
+import base64
+import io
+
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+
+from api.cache import recipe_fragment_key
+from api.serializers import RecipeGetSerializer
+from api.views import RecipeViewSet
+from benchmarks.dataset import PREFIX
+from recipes.images import delete_files
+from recipes.images import get_variant_names
+from recipes.models import Ingredient
+from recipes.models import Recipe
+from recipes.models import Tag
+from users.models import User
+
+
+class Context:
+    """Общие для всех операций пользователь, клиент API и данные."""
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.user = User.objects.filter(
+            username__startswith=f"{PREFIX}_user_"
+        ).order_by("-recipes_count", "id").first()
+
+        if self.user is None:
+            raise RuntimeError("Тестовые данные не созданы")
+
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.recipe_ids = list(
+            Recipe.objects.order_by("-pub_date").values_list("id", flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list("id", flat=True)[:2])
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by("id").values_list("id", flat=True)
+        )
+
+
+def check(response):
+    """Проверяет код ответа и дочитывает потоковый ответ."""
+
+    if response.streaming:
+        b"".join(response.streaming_content)
+
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f"{response.request['PATH_INFO']}: {response.status_code} "
+            f"{response.content[:200]!r}"
+        )
+
+    return response
+
+
+def make_image():
+    """Возвращает изображение для создания рецепта в base64."""
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), "green").save(buffer, "PNG")
+
+    return ("data:image/png;base64,"
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Case:
+    """Измеряемая операция. run выполняется для каждой итерации,
+    prepare перед ней без учета времени, setup и teardown один раз."""
+
+    name = None
+
+    def __init__(self, context):
+        self.context = context
+        self.client = context.client
+
+    def setup(self):
+        pass
+
+    def prepare(self, i):
+        pass
+
+    def run(self, i):
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+
+class RecipeListCase(Case):
+    name = "recipes_list"
+
+    def run(self, i):
+        pages = max(1, min(10, len(self.context.recipe_ids)
+                           // self.context.page_size))
+        check(self.client.get(
+            "/api/recipes/",
+            {"limit": self.context.page_size, "page": i % pages + 1}
+        ))
+
+
+class RecipeRetrieveCase(Case):
+    name = "recipes_retrieve"
+
+    def run(self, i):
+        recipe_ids = self.context.recipe_ids
+        check(self.client.get(
+            f"/api/recipes/{recipe_ids[i % len(recipe_ids)]}/"
+        ))
+
+
+class RecipeCreateCase(Case):
+    """Создает рецепты через API и удаляет их после замера."""
+
+    name = "recipes_create"
+
+    def setup(self):
+        self.image = make_image()
+        self.created = []
+
+    def run(self, i):
+        ingredient_ids = self.context.ingredient_ids
+        response = check(self.client.post("/api/recipes/", {
+            "name": f"{PREFIX} created {i}",
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": self.image,
+            "tags": self.context.tag_ids,
+            "ingredients": [
+                {"id": ingredient_ids[(i + n) % len(ingredient_ids)],
+                 "amount": 100}
+                for n in range(5)
+            ],
+        }, format="json"))
+        self.created.append(response.data["id"])
+
+    def teardown(self):
+        for recipe in Recipe.objects.filter(id__in=self.created):
+            recipe.image.delete(save=False)
+            delete_files(get_variant_names(recipe.image_variants))
+            self.client.delete(f"/api/recipes/{recipe.id}/")
+
+
+class RecipeUpdateCase(Case):
+    """Изменяет количество ингредиентов рецепта пользователя."""
+
+    name = "recipes_update"
+
+    def setup(self):
+        self.recipe = Recipe.objects.filter(
+            author=self.context.user
+        ).prefetch_related("recipes").first()
+
+        if self.recipe is None:
+            raise RuntimeError("У пользователя нет рецептов")
+
+        self.ingredients = [
+            (item.ingredient_id, item.amount)
+            for item in self.recipe.recipes.all()
+        ]
+
+    def run(self, i):
+        check(self.client.patch(f"/api/recipes/{self.recipe.id}/", {
+            "name": self.recipe.name,
+            "text": self.recipe.text,
+            "cooking_time": self.recipe.cooking_time,
+            "tags": self.context.tag_ids,
+            "ingredients": [
+                {"id": ingredient_id, "amount": amount + i % 2}
+                for ingredient_id, amount in self.ingredients
+            ],
+        }, format="json"))
+
+
+class ShoppingCartDownloadCase(Case):
+    name = "download_shopping_cart"
+
+    def run(self, i):
+        check(self.client.get("/api/recipes/download_shopping_cart/"))
+
+
+class IngredientSearchCase(Case):
+    name = "ingredients_search"
+
+    def setup(self):
+        names = Ingredient.objects.order_by("id").values_list(
+            "name", flat=True
+        )[:100]
+        self.queries = sorted({name[:3] for name in names}) or ["а"]
+
+    def run(self, i):
+        check(self.client.get(
+            "/api/ingredients/",
+            {"name": self.queries[i % len(self.queries)]}
+        ))
+
+
+class SubscriptionsCase(Case):
+    name = "users_subscriptions"
+
+    def run(self, i):
+        check(self.client.get(
+            "/api/users/subscriptions/",
+            {"limit": self.context.page_size, "recipes_limit": 3}
+        ))
+
+
+class RecipeSerializerCase(Case):
+    """Сериализация страницы рецептов RecipeGetSerializer без запроса
+    к API. Рецепты загружаются один раз запросом RecipeViewSet.list."""
+
+    name = "recipe_serializer"
+    cold = False
+
+    def setup(self):
+        request = Request(APIRequestFactory().get("/api/recipes/"))
+        request.user = self.context.user
+        view = RecipeViewSet(request=request, action="list", kwargs={},
+                             format_kwarg=None)
+        self.recipes = list(view.get_queryset()[:self.context.page_size])
+        self.serializer_context = view.get_serializer_context()
+
+    def prepare(self, i):
+        if self.cold:
+            cache.delete_many(
+                [recipe_fragment_key(recipe) for recipe in self.recipes]
+            )
+
+    def run(self, i):
+        RecipeGetSerializer(self.recipes, many=True,
+                            context=self.serializer_context).data
+
+
+class RecipeSerializerColdCase(RecipeSerializerCase):
+    """Сериализация страницы рецептов без фрагментов в кэше."""
+
+    name = "recipe_serializer_cold"
+    cold = True
+
+
+CASES = (
+    RecipeListCase,
+    RecipeRetrieveCase,
+    RecipeCreateCase,
+    RecipeUpdateCase,
+    ShoppingCartDownloadCase,
+    IngredientSearchCase,
+    SubscriptionsCase,
+    RecipeSerializerCase,
+    RecipeSerializerColdCase,
+)
@@ -0,0 +1,226 @@
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import bump_version
+from api.search import log_recipe_changes
+from api.utils import count_subquery
+from recipes import shopping_list
+from recipes import timeline
+from recipes.models import Favorite
+from recipes.models import Ingredient
+from recipes.models import IngredientAmount
+from recipes.models import Recipe
+from recipes.models import ShoppingCart
+from recipes.models import Tag
+from users.models import Subscribe
+from users.models import User
+
+PREFIX = "bench"
+IMAGE_NAME = "recipe_images/bench.png"
+BATCH_SIZE = 1000
+TAGS_COUNT = 6
+UNITS = ("г", "мл", "шт", "ст. л.", "ч. л.")
+WORDS = (
+    "соль", "сахар", "мука", "молоко", "масло", "яйцо", "морковь",
+    "лук", "картофель", "томат", "перец", "сыр", "рис", "гречка",
+    "курица", "говядина", "рыба", "яблоко", "лимон", "чеснок",
+)
+VERSION_NAMES = ("recipes", "tags", "ingredients", "authors")
+
+
+def is_seeded():
+    """Возвращает True, если тестовые данные уже созданы."""
+
+    return User.objects.filter(username__startswith=f"{PREFIX}_").exists()
+
+
+def save_image():
+    """Сохраняет общее для всех тестовых рецептов изображение."""
+
+    if default_storage.exists(IMAGE_NAME):
+        return
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), "orange").save(buffer, "PNG")
+    default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+
+
+def create_users(count):
+    """Создает пользователей и возвращает их id."""
+
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=f"{PREFIX}_user_{n}",
+              email=f"{PREFIX}_user_{n}@example.com",
+              first_name="Bench",
+              last_name=str(n),
+              password=password)
+         for n in range(count)],
+        batch_size=BATCH_SIZE
+    )
+
+    return list(User.objects.filter(
+        username__startswith=f"{PREFIX}_user_"
+    ).order_by("id").values_list("id", flat=True))
+
+
+def create_tags():
+    """Создает теги и возвращает их id."""
+
+    Tag.objects.bulk_create(
+        [Tag(name=f"{PREFIX} tag {n}",
+             color=f"#bec{n:03d}",
+             slug=f"{PREFIX}-{n}")
+         for n in range(TAGS_COUNT)],
+        ignore_conflicts=True
+    )
+
+    return list(Tag.objects.filter(
+        slug__startswith=f"{PREFIX}-"
+    ).order_by("id").values_list("id", flat=True))
+
+
+def create_ingredients(count, rng):
+    """Создает ингредиенты и возвращает их id."""
+
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f"{WORDS[n % len(WORDS)]} {PREFIX} {n}",
+                    measurement_unit=rng.choice(UNITS))
+         for n in range(count)],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+    return list(Ingredient.objects.filter(
+        name__contains=f" {PREFIX} "
+    ).order_by("id").values_list("id", flat=True))
+
+
+def create_recipes(count, user_ids, rng):
+    """Создает рецепты с датами публикации на минуту раньше друг друга
+    и возвращает их id."""
+
+    Recipe.objects.bulk_create(
+        [Recipe(author_id=rng.choice(user_ids),
+                name=f"{PREFIX} recipe {n}",
+                text=" ".join(rng.choices(WORDS, k=30)),
+                cooking_time=rng.randint(5, 120),
+                image=IMAGE_NAME)
+         for n in range(count)],
+        batch_size=BATCH_SIZE
+    )
+    recipes = list(Recipe.objects.filter(
+        name__startswith=f"{PREFIX} recipe "
+    ).order_by("id").only("id"))
+    now = timezone.now()
+
+    for n, recipe in enumerate(recipes):
+        recipe.pub_date = now - timedelta(minutes=n)
+
+    Recipe.objects.bulk_update(recipes, ["pub_date"], batch_size=BATCH_SIZE)
+
+    return [recipe.id for recipe in recipes]
+
+
+def create_relations(recipe_ids, tag_ids, ingredient_ids, rng):
+    """Добавляет рецептам от 1 до 2 тегов и от 3 до 10 ингредиентов."""
+
+    Recipe.tags.through.objects.bulk_create(
+        [Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in recipe_ids
+         for tag_id in rng.sample(tag_ids, rng.randint(1, 2))],
+        batch_size=BATCH_SIZE
+    )
+    IngredientAmount.objects.bulk_create(
+        [IngredientAmount(recipe_id=recipe_id,
+                          ingredient_id=ingredient_id,
+                          amount=rng.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient_id in rng.sample(
+             ingredient_ids, min(rng.randint(3, 10), len(ingredient_ids))
+        )],
+        batch_size=BATCH_SIZE
+    )
+
+
+def create_user_relations(model, field, user_ids, targets, per_user, rng):
+    """Создает каждому пользователю per_user связей model
+    со случайными объектами targets, не связывая пользователя
+    с самим собой."""
+
+    objects = []
+
+    for user_id in user_ids:
+        chosen = [
+            target
+            for target in rng.sample(targets,
+                                     min(per_user + 1, len(targets)))
+            if field != "author" or target != user_id
+        ]
+        objects.extend(
+            model(user_id=user_id, **{f"{field}_id": target})
+            for target in chosen[:per_user]
+        )
+
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def update_counters():
+    """Пересчитывает счетчики пользователей и рецептов."""
+
+    User.objects.update(
+        recipes_count=count_subquery(Recipe.objects, "author"),
+        followers_count=count_subquery(Subscribe.objects, "author")
+    )
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite.objects, "recipe")
+    )
+
+
+@transaction.atomic
+def seed(users, recipes, ingredients, favorites, carts, subscriptions,
+         random_seed=0):
+    """Создает воспроизводимый набор тестовых данных: при одинаковых
+    параметрах и random_seed данные совпадают. Счетчики, ленты
+    подписок и сводные списки покупок пересчитываются."""
+
+    rng = random.Random(random_seed)
+    save_image()
+    user_ids = create_users(users)
+    tag_ids = create_tags()
+    ingredient_ids = create_ingredients(ingredients, rng)
+    recipe_ids = create_recipes(recipes, user_ids, rng)
+    create_relations(recipe_ids, tag_ids, ingredient_ids, rng)
+    create_user_relations(Favorite, "recipe", user_ids, recipe_ids,
+                          favorites, rng)
+    create_user_relations(ShoppingCart, "recipe", user_ids, recipe_ids,
+                          carts, rng)
+    create_user_relations(Subscribe, "author", user_ids, user_ids,
+                          subscriptions, rng)
+    update_counters()
+    timeline.rebuild()
+    shopping_list.rebuild()
+
+    for name in VERSION_NAMES:
+        bump_version(name)
+
+    log_recipe_changes()
+
+
+def describe():
+    """Возвращает количество строк в основных таблицах."""
+
+    models = (User, Recipe, Ingredient, Tag, IngredientAmount, Favorite,
+              ShoppingCart, Subscribe)
+
+    return {
+        model._meta.db_table: model.objects.count() for model in models
+    }
@@ -0,0 +1,124 @@
+import json
+import time
+
+from django.db import connection
+
+from recipes import jobs
+
+
+class QueryCounter:
+    """Обертка execute_wrapper, считающая SQL запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, percent):
+    """Возвращает перцентиль отсортированного списка values
+    методом ближайшего ранга."""
+
+    index = max(0, -(-len(values) * percent // 100) - 1)
+
+    return values[int(index)]
+
+
+def measure(case, iterations, warmup):
+    """Выполняет операцию case warmup раз без учета и iterations раз
+    с замером времени и количества SQL запросов каждого вызова.
+    Фоновые задачи вызова дожидаются вне замера, чтобы они
+    не выполнялись одновременно со следующим вызовом."""
+
+    timings = []
+    queries = []
+
+    for i in range(warmup + iterations):
+        case.prepare(i)
+        counter = QueryCounter()
+
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            case.run(i)
+            elapsed = time.perf_counter() - started
+
+        jobs.drain()
+
+        if i >= warmup:
+            timings.append(elapsed)
+            queries.append(counter.count)
+
+    return timings, queries
+
+
+def summarize(timings, queries):
+    """Возвращает пропускную способность, перцентили времени
+    в миллисекундах и количество запросов к БД."""
+
+    timings = sorted(timings)
+    total = sum(timings)
+
+    return {
+        "iterations": len(timings),
+        "throughput": round(len(timings) / total, 2) if total else None,
+        "mean_ms": round(total / len(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "queries_mean": round(sum(queries) / len(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+def run_case(case, iterations, warmup):
+    """Подготавливает, измеряет и очищает данные операции case."""
+
+    case.setup()
+
+    try:
+        timings, queries = measure(case, iterations, warmup)
+    finally:
+        jobs.drain()
+        case.teardown()
+        jobs.drain()
+
+    return summarize(timings, queries)
+
+
+def compare(previous, current):
+    """Возвращает строки сравнения p50, p95 и количества запросов
+    с результатами предыдущего запуска."""
+
+    lines = []
+
+    for name, result in current["results"].items():
+        old = previous.get("results", {}).get(name)
+
+        if old is None:
+            continue
+
+        changes = ", ".join(
+            f"{key} {old[key]} -> {result[key]} "
+            f"({(result[key] - old[key]) / old[key] * 100:+.1f}%)"
+            if old[key] else f"{key} {old[key]} -> {result[key]}"
+            for key in ("p50_ms", "p95_ms", "queries_mean")
+        )
+        lines.append(f"{name}: {changes}")
+
+    return lines
+
+
+def save(path, report):
+    """Сохраняет отчет в JSON файл."""
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    """Читает отчет предыдущего запуска."""
+
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
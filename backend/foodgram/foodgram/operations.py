@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class PostgreSQLRunSQL(migrations.RunSQL):
+    """RunSQL, который выполняется только на PostgreSQL. На других базах
+    данных миграция применяется без изменений схемы."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor,
+                                      from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor,
+                                       from_state, to_state)
@@ -55,6 +55,7 @@ DJOSER = {
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +96,36 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', 300)
+)
+
+VERSION_CACHE_TIMEOUT = int(
+    os.getenv('VERSION_CACHE_TIMEOUT', 300)
+)
+
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', 50)
+)
+
+RECIPE_INDEX_REFRESH_INTERVAL = int(
+    os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 10)
+)
+
+RECIPE_INDEX_CHANGES_TTL = int(
+    os.getenv('RECIPE_INDEX_CHANGES_TTL', 24 * 60 * 60)
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,3 +159,29 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+)
+
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 25_000_000))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+
+FEED_BACKFILL_SIZE = 100
+
+FEED_BATCH_SIZE = 1000
+
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', 1))
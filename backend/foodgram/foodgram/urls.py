@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import include
 from django.urls import path
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path(
         "admin/",
@@ -10,5 +12,10 @@ urlpatterns = [
     path(
         "api/",
         include("api.urls", namespace="api")
+    ),
+    path(
+        "metrics",
+        metrics_view,
+        name="metrics"
     )
 ]
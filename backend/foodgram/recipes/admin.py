@@ -1,10 +1,12 @@
 from django.contrib import admin
 
+from recipes import ingredient_amounts
 from recipes.models import Favorite
 from recipes.models import Ingredient
 from recipes.models import IngredientAmount
 from recipes.models import Recipe
 from recipes.models import ShoppingCart
+from recipes.models import ShoppingListItem
 from recipes.models import Tag
 
 
@@ -44,7 +46,8 @@ class RecipeAdmin(admin.ModelAdmin):
         "text",
         "cooking_time",
         "image",
-        "pub_date"
+        "pub_date",
+        "favorites_count"
     )
     list_editable = (
         "name",
@@ -72,6 +75,17 @@ class IngredientAmountAdmin(admin.ModelAdmin):
         "amount"
     )
 
+    def save_model(self, request, obj, form, change):
+        ingredient_amounts.save_amount(obj)
+
+    def delete_model(self, request, obj):
+        ingredient_amounts.delete_amounts(
+            IngredientAmount.objects.filter(pk=obj.pk)
+        )
+
+    def delete_queryset(self, request, queryset):
+        ingredient_amounts.delete_amounts(queryset)
+
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = (
@@ -97,9 +111,20 @@ class FavoriteAdmin(admin.ModelAdmin):
     )
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "user",
+        "ingredient",
+        "total_amount"
+    )
+    list_filter = ("user",)
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(IngredientAmount, IngredientAmountAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
@@ -0,0 +1,126 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from PIL import ImageOps
+
+from recipes import jobs
+from recipes.models import Recipe
+
+VARIANTS_DIR = "recipe_images/variants"
+PILLOW_FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+}
+
+
+def get_variant_names(variants):
+    """Возвращает множество путей файлов из словаря вариантов."""
+
+    return {
+        name
+        for formats in (variants or {}).values()
+        for name in formats.values()
+    }
+
+
+def get_variant_urls(variants, request=None):
+    """Возвращает словарь {размер: {формат: url}} для вариантов
+    изображения. При переданном request ссылки абсолютные."""
+
+    urls = {}
+
+    for size, formats in (variants or {}).items():
+        urls[size] = {}
+
+        for image_format, name in formats.items():
+            url = default_storage.url(name)
+            urls[size][image_format] = (
+                request.build_absolute_uri(url) if request else url
+            )
+
+    return urls
+
+
+def render_variants(recipe_id, source):
+    """Создает уменьшенные копии изображения source во всех размерах
+    и форматах из настроек и сохраняет их в хранилище."""
+
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {}
+
+    with default_storage.open(source, "rb") as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+        for size, dimensions in settings.RECIPE_IMAGE_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(dimensions, Image.LANCZOS)
+
+            for image_format in settings.RECIPE_IMAGE_FORMATS:
+                buffer = io.BytesIO()
+                resized.save(
+                    buffer,
+                    PILLOW_FORMATS[image_format],
+                    quality=settings.RECIPE_IMAGE_QUALITY
+                )
+                variants.setdefault(size, {})[image_format] = (
+                    default_storage.save(
+                        f"{VARIANTS_DIR}/{recipe_id}/"
+                        f"{stem}_{size}.{image_format}",
+                        ContentFile(buffer.getvalue())
+                    )
+                )
+
+    return variants
+
+
+def delete_files(names):
+    """Удаляет файлы из хранилища."""
+
+    for name in names:
+        default_storage.delete(name)
+
+
+def build_variants(recipe_id):
+    """Строит варианты изображения рецепта и сохраняет их пути в
+    image_variants. Если за время обработки изображение рецепта
+    сменилось, результат отбрасывается."""
+
+    recipe = Recipe.objects.filter(pk=recipe_id).only("image").first()
+
+    if recipe is None or not recipe.image:
+        return
+
+    source = recipe.image.name
+    variants = render_variants(recipe_id, source)
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id
+        ).first()
+
+        if recipe is None or recipe.image.name != source:
+            delete_files(get_variant_names(variants))
+            return
+
+        stale = (
+            get_variant_names(recipe.image_variants)
+            - get_variant_names(variants)
+        )
+        recipe.image_variants = variants
+        recipe.save(update_fields=["image_variants", "updated_at"])
+
+    delete_files(stale)
+
+
+def schedule_variants(recipe_id):
+    """Ставит обработку изображения рецепта в очередь после фиксации
+    транзакции. Если RECIPE_IMAGE_WORKERS равен нулю, обработка
+    выполняется сразу после фиксации в текущем потоке."""
+
+    jobs.schedule("recipe-images", settings.RECIPE_IMAGE_WORKERS,
+                  build_variants, recipe_id)
@@ -0,0 +1,60 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from recipes import shopping_list
+from recipes.models import IngredientAmount
+
+# Отправляется с аргументом recipe_ids после изменения ингредиентов
+# рецептов функциями этого модуля.
+recipe_ingredients_changed = Signal()
+
+
+def apply_changes(changes):
+    """Переносит изменения {id рецепта: (старые, новые количества)}
+    в сводные списки покупок и сообщает об измененных рецептах."""
+
+    for recipe_id, (old_amounts, new_amounts) in changes.items():
+        shopping_list.change_recipe(recipe_id, old_amounts, new_amounts)
+
+    recipe_ingredients_changed.send(
+        sender=IngredientAmount,
+        recipe_ids=list(changes)
+    )
+
+
+@transaction.atomic
+def save_amount(amount):
+    """Сохраняет количество ингредиента рецепта. Если строка перенесена
+    в другой рецепт, изменение учитывается у обоих рецептов."""
+
+    changes = defaultdict(lambda: ({}, {}))
+    old = IngredientAmount.objects.select_for_update().filter(
+        pk=amount.pk
+    ).values_list("recipe_id", "ingredient_id", "amount").first()
+
+    if old is not None:
+        recipe_id, ingredient_id, old_amount = old
+        changes[recipe_id][0][ingredient_id] = old_amount
+
+    amount.save()
+    changes[amount.recipe_id][1][amount.ingredient_id] = amount.amount
+    apply_changes(changes)
+
+
+@transaction.atomic
+def delete_amounts(queryset):
+    """Удаляет строки queryset и убирает их количества из сводных
+    списков покупок."""
+
+    changes = defaultdict(lambda: ({}, {}))
+    rows = queryset.select_for_update().values_list(
+        "recipe_id", "ingredient_id", "amount"
+    )
+
+    for recipe_id, ingredient_id, amount in rows:
+        changes[recipe_id][0][ingredient_id] = amount
+
+    queryset.delete()
+    apply_changes(changes)
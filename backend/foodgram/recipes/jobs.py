@@ -0,0 +1,63 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+executors = {}
+executors_lock = threading.Lock()
+
+
+def get_executor(name, workers):
+    """Возвращает пул потоков с именем name, создавая его при первом
+    обращении."""
+
+    with executors_lock:
+        if name not in executors:
+            executors[name] = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix=name
+            )
+
+        return executors[name]
+
+
+def run_job(func, *args):
+    """Выполняет задачу в потоке пула, записывая ошибки в лог.
+    Соединение с БД потока закрывается после выполнения."""
+
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Не удалось выполнить задачу %s%s",
+                         func.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule(name, workers, func, *args):
+    """Ставит вызов func(*args) в пул name после фиксации транзакции.
+    Если workers равен нулю, вызов выполняется сразу после фиксации
+    в текущем потоке."""
+
+    if not workers:
+        transaction.on_commit(lambda: func(*args))
+        return
+
+    executor = get_executor(name, workers)
+    transaction.on_commit(lambda: executor.submit(run_job, func, *args))
+
+
+def drain():
+    """Дожидается выполнения всех поставленных в пулы задач. Пулы
+    создаются заново при следующем обращении."""
+
+    with executors_lock:
+        pending = list(executors.values())
+        executors.clear()
+
+    for executor in pending:
+        executor.shutdown(wait=True)
@@ -0,0 +1,98 @@
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from benchmarks import dataset
+from benchmarks import runner
+from benchmarks.cases import CASES
+from benchmarks.cases import Context
+
+
+class Command(BaseCommand):
+    help = ("Замер скорости основных запросов к API на тестовых данных. "
+            "Запускайте на отдельной базе данных")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipes", type=int, default=2000)
+        parser.add_argument("--ingredients", type=int, default=1000)
+        parser.add_argument("--favorites", type=int, default=20,
+                            help="Избранных рецептов на пользователя")
+        parser.add_argument("--carts", type=int, default=5,
+                            help="Рецептов в корзине на пользователя")
+        parser.add_argument("--subscriptions", type=int, default=10,
+                            help="Подписок на пользователя")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Начальное значение генератора данных")
+        parser.add_argument("--iterations", type=int, default=100)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--page-size", type=int, default=6)
+        parser.add_argument("--case", action="append", dest="cases",
+                            choices=[case.name for case in CASES])
+        parser.add_argument("--output", type=str,
+                            help="Файл для сохранения результатов в JSON")
+        parser.add_argument("--compare", type=str,
+                            help="Файл с результатами предыдущего запуска")
+
+    def seed(self, options):
+        """Создает тестовые данные, если их еще нет."""
+
+        if dataset.is_seeded():
+            self.stdout.write("Тестовые данные уже созданы")
+            return
+
+        dataset.seed(options["users"], options["recipes"],
+                     options["ingredients"], options["favorites"],
+                     options["carts"], options["subscriptions"],
+                     options["seed"])
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations должно быть больше нуля")
+
+        self.seed(options)
+        context = Context(options["page_size"])
+        cases = [
+            case for case in CASES
+            if not options["cases"] or case.name in options["cases"]
+        ]
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "debug": settings.DEBUG,
+            "options": {
+                name: options[name] for name in (
+                    "users", "recipes", "ingredients", "favorites", "carts",
+                    "subscriptions", "seed", "iterations", "warmup",
+                    "page_size"
+                )
+            },
+            "dataset": dataset.describe(),
+            "results": {},
+        }
+
+        for case in cases:
+            result = runner.run_case(case(context), options["iterations"],
+                                     options["warmup"])
+            report["results"][case.name] = result
+            self.stdout.write(
+                f"{case.name}: {result['throughput']} оп/с, "
+                f"p50 {result['p50_ms']} мс, p95 {result['p95_ms']} мс, "
+                f"p99 {result['p99_ms']} мс, "
+                f"запросов {result['queries_mean']}"
+            )
+
+        if options["compare"]:
+            for line in runner.compare(runner.load(options["compare"]),
+                                       report):
+                self.stdout.write(line)
+
+        if options["output"]:
+            runner.save(options["output"], report)
+
+        self.stdout.write(self.style.SUCCESS("Замер завершен"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Создание уменьшенных копий изображений рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать копии для всех рецептов"
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+
+        recipe_ids = list(recipes.values_list("id", flat=True))
+
+        for recipe_id in recipe_ids:
+            build_variants(recipe_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {len(recipe_ids)}")
+        )
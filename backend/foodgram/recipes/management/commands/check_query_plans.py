@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+
+from api.explain import check_endpoints
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Проверка планов выполнения основных запросов к API: "
+            "все таблицы должны читаться по индексам")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=str, dest="username")
+
+    def handle(self, *args, **options):
+        user = None
+
+        if options["username"]:
+            user = User.objects.filter(username=options["username"]).first()
+            if user is None:
+                raise CommandError(
+                    f"Пользователь {options['username']} не найден")
+
+        if connection.vendor != "postgresql":
+            self.stderr.write(self.style.WARNING(
+                f"Проверяются планы {connection.vendor}, а не PostgreSQL: "
+                "результат не переносится на рабочую базу данных"))
+
+        try:
+            results = check_endpoints(user)
+        except AssertionError as error:
+            raise CommandError(error)
+
+        failed = 0
+
+        for path, problems in results.items():
+            if not problems:
+                self.stdout.write(f"{path}: OK")
+                continue
+            failed += 1
+            for table, sql in problems:
+                self.stdout.write(self.style.ERROR(
+                    f"{path}: полный просмотр {table}\n  {sql}"))
+
+        if failed:
+            raise CommandError(
+                f"Запросов с полным просмотром таблиц: {failed}")
+
+        self.stdout.write(self.style.SUCCESS("Все запросы используют индексы"))
@@ -0,0 +1,52 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import copy_image_to
+from recipes.transfer import iter_recipes
+from recipes.transfer import recipe_to_row
+
+
+class Command(BaseCommand):
+    help = "Выгрузка рецептов в формате NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Файл для выгрузки, по умолчанию stdout"
+        )
+        parser.add_argument(
+            "--media",
+            type=str,
+            help="Каталог, в который копируются изображения"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = (
+            open(options["output"], "w", encoding="utf-8")
+            if options["output"] else sys.stdout
+        )
+        total = 0
+
+        try:
+            for recipe in iter_recipes(options["batch_size"]):
+                output.write(
+                    json.dumps(recipe_to_row(recipe), ensure_ascii=False)
+                    + "\n"
+                )
+                if options["media"]:
+                    copy_image_to(recipe.image.name, options["media"])
+                total += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Выгружено рецептов: {total} "
+            f"за {time.monotonic() - started:.1f} с")
+        )
@@ -0,0 +1,192 @@
+import json
+import os
+import time
+from concurrent.futures import ALL_COMPLETED
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import connections
+
+from api.cache import bump_version
+from api.search import log_recipe_changes
+from recipes.transfer import import_rows
+
+
+def read_batches(path, batch_size):
+    """Возвращает пары (номер пачки, строки пачки) из NDJSON файла."""
+
+    with open(path, "r", encoding="utf-8") as file:
+        index = 0
+        while True:
+            lines = list(islice(file, batch_size))
+            if not lines:
+                return
+            yield index, lines
+            index += 1
+
+
+def drop_duplicates(batches):
+    """Убирает из пачек строки с рецептом (автор, название), который
+    уже встречался в предыдущих пачках, чтобы параллельные процессы
+    не создавали один и тот же рецепт одновременно."""
+
+    seen = set()
+
+    for index, lines in batches:
+        unique = []
+        for line in lines:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            key = (row["author"], row["name"])
+            if key not in seen:
+                seen.add(key)
+                unique.append(line)
+        yield index, unique
+
+
+class Checkpoint:
+    """Файл с номерами импортированных пачек для продолжения
+    прерванной загрузки. Номера пачек зависят от размера пачки,
+    поэтому он записывается в первую строку файла."""
+
+    def __init__(self, path, batch_size):
+        self.done = set()
+        self.file = None
+
+        if not path:
+            return
+
+        header = f"batch_size={batch_size}\n"
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                if file.readline() != header:
+                    raise CommandError(
+                        "Файл контрольной точки создан с другим --batch-size"
+                    )
+                self.done = {int(line) for line in file if line.strip()}
+            self.file = open(path, "a", encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+            self.file.write(header)
+
+    def add(self, index):
+        self.done.add(index)
+        if self.file:
+            self.file.write(f"{index}\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class Command(BaseCommand):
+    help = "Загрузка рецептов из NDJSON файла, созданного export_recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str)
+        parser.add_argument(
+            "--media",
+            type=str,
+            help="Каталог с изображениями из export_recipes --media"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Количество процессов загрузки"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="Файл контрольной точки для продолжения загрузки"
+        )
+
+    def report(self, index, result):
+        created, skipped = result
+        self.total += created
+        self.skipped += skipped
+        self.stdout.write(
+            f"Пачка {index}: создано рецептов {created}, всего {self.total} "
+            f"({time.monotonic() - self.started:.1f} с)"
+        )
+        if skipped:
+            self.stderr.write(
+                f"Пачка {index}: пропущено строк с неизвестным автором "
+                f"{skipped}"
+            )
+
+    def run_serial(self, batches, checkpoint, media):
+        for index, lines in batches:
+            self.report(index, import_rows(lines, media))
+            checkpoint.add(index)
+
+    def run_parallel(self, batches, checkpoint, media, workers):
+        # Дочерние процессы открывают собственные соединения с БД.
+        connections.close_all()
+        pending = {}
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for index, lines in batches:
+                pending[executor.submit(import_rows, lines, media)] = index
+                if len(pending) >= workers * 2:
+                    self.collect(pending, checkpoint, FIRST_COMPLETED)
+            self.collect(pending, checkpoint)
+
+    def collect(self, pending, checkpoint, return_when=ALL_COMPLETED):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            index = pending.pop(future)
+            self.report(index, future.result())
+            checkpoint.add(index)
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options["path"]):
+            raise CommandError(f"Файл {options['path']} не найден")
+
+        if options["workers"] > 1 and connection.vendor == "sqlite":
+            raise CommandError(
+                "SQLite не поддерживает параллельную запись, "
+                "используйте --workers 1"
+            )
+
+        self.started = time.monotonic()
+        self.total = 0
+        self.skipped = 0
+        checkpoint = Checkpoint(options["checkpoint"], options["batch_size"])
+        batches = read_batches(options["path"], options["batch_size"])
+
+        if options["workers"] > 1:
+            batches = drop_duplicates(batches)
+
+        batches = (
+            (index, lines) for index, lines in batches
+            if index not in checkpoint.done
+        )
+
+        try:
+            if options["workers"] > 1:
+                self.run_parallel(batches, checkpoint, options["media"],
+                                  options["workers"])
+            else:
+                self.run_serial(batches, checkpoint, options["media"])
+        finally:
+            checkpoint.close()
+            bump_version("recipes")
+            log_recipe_changes()
+            bump_version("ingredients")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Загрузка рецептов завершена: создано {self.total} "
+            f"за {time.monotonic() - self.started:.1f} с, пропущено строк "
+            f"с неизвестным автором {self.skipped}. "
+            "Уменьшенные копии изображений создаются командой "
+            "build_image_variants, ленты подписок - rebuild_feeds")
+        )
@@ -1,37 +1,181 @@
+import csv
 import json
 import os
+import re
+import time
 
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
 
+from api.cache import bump_version
 from foodgram.settings import BASE_DIR
 from recipes.models import Ingredient
 
+CHUNK_SIZE = 64 * 1024
+
+SEPARATORS = re.compile(r"[\s,]*")
+
+
+def read_csv(file):
+    """Построчно читает CSV файл вида: название,единица измерения."""
+
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def split_json_items(buffer, decoder):
+    """Извлекает из буфера все полностью прочитанные элементы массива.
+    Возвращает элементы и непрочитанный остаток буфера."""
+
+    items = []
+    position = 0
+
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if position == len(buffer) or buffer[position] == "]":
+            break
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+
+    return items, buffer[position:]
+
+
+def parse_json_item(item, number):
+    """Возвращает пару (название, единица измерения) из элемента массива.
+    Сообщает номер элемента, если это не объект с двумя строками."""
+
+    if not isinstance(item, dict) or not all(
+        isinstance(item.get(key), str)
+        for key in ("name", "measurement_unit")
+    ):
+        raise CommandError(
+            f"Элемент {number}: ожидается объект со строковыми полями "
+            f"name и measurement_unit, получено {item!r:.100}"
+        )
+
+    return item["name"], item["measurement_unit"]
+
+
+def read_json(file):
+    """Читает JSON массив объектов по одному элементу,
+    не загружая файл в память целиком."""
+
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+
+    if not buffer.startswith("["):
+        raise CommandError("Ожидается JSON массив")
+    buffer = buffer[1:]
+    number = 0
+
+    while True:
+        items, buffer = split_json_items(buffer, decoder)
+        for item in items:
+            number += 1
+            yield parse_json_item(item, number)
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+
+    if buffer.strip() not in ("", "]"):
+        raise CommandError("Некорректный JSON в конце файла")
+
 
 class Command(BaseCommand):
-    help = "Загрузка ингредиентов из JSON файла"
+    help = "Загрузка ингредиентов из CSV или JSON файла"
 
     def add_arguments(self, parser):
         parser.add_argument("--json", type=str)
+        parser.add_argument("--csv", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Количество строк в одном запросе INSERT"
+        )
 
-    def handle(self, *args, **options):
-        json_file = os.path.join(BASE_DIR, "ingredients.json")
+    def get_source(self, options):
+        """Возвращает путь к файлу и функцию чтения."""
+
+        if options["csv"]:
+            return options["csv"], read_csv
+        if options["json"]:
+            return options["json"], read_json
+        return os.path.join(BASE_DIR, "ingredients.json"), read_json
+
+    def read_rows(self, path, reader):
+        """Возвращает новые уникальные пары (название, единица измерения)
+        из файла, пропуская пустые, слишком длинные и уже загруженные."""
+
+        seen = set(Ingredient.objects.values_list("name", "measurement_unit"))
+        max_length = Ingredient._meta.get_field("name").max_length
 
-        if json_file:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            for name, unit in reader(file):
+                key = (name.strip(), unit.strip())
+                if (
+                    not all(key)
+                    or max(map(len, key)) > max_length
+                    or key in seen
+                ):
+                    continue
+                seen.add(key)
+                yield key
 
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    def insert(self, batch):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in batch
+            ],
+            ignore_conflicts=True
+        )
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        """Вставляет строки пачками, уже существующие пропускаются
+        по ограничению уникальности. Возвращает число отправленных строк."""
+
+        started = time.monotonic()
+        batch = []
+        total = 0
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self.insert(batch)
+                total += len(batch)
+                batch = []
+                self.stdout.write(
+                    f"Отправлено строк: {total} "
+                    f"({time.monotonic() - started:.1f} с)"
+                )
+
+        if batch:
+            self.insert(batch)
+            total += len(batch)
+
+        return total
+
+    def handle(self, *args, **options):
+        path, reader = self.get_source(options)
 
-                for item in data:
-                    ingredient = Ingredient(
-                        name=item["name"],
-                        measurement_unit=item["measurement_unit"])
-                    ingredient.save()
+        if not os.path.isfile(path):
+            raise CommandError(f"Файл {path} не найден")
 
-            self.stdout.write(self.style.SUCCESS(
-                "Загрузка ингредиентов из файла JSON завершена")
-            )
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        self.load(self.read_rows(path, reader), options["batch_size"])
+        created = Ingredient.objects.count() - before
+        bump_version("ingredients")
 
-        else:
-            self.stdout.write(self.style.ERROR(
-                "Файл JSON не найден")
-            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Загрузка ингредиентов завершена: добавлено {created} "
+            f"за {time.monotonic() - started:.1f} с")
+        )
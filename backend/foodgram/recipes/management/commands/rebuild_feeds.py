@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes import timeline
+
+
+class Command(BaseCommand):
+    help = "Пересоздание лент подписок по текущим подпискам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, nargs="+", dest="users")
+
+    def handle(self, *args, **options):
+        created = timeline.rebuild(options["users"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ленты подписок пересозданы, записей: {created}")
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = "Пересчет сводных списков покупок по корзинам пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, nargs="+", dest="users")
+
+    def handle(self, *args, **options):
+        created = shopping_list.rebuild(options["users"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Сводные списки покупок пересчитаны, строк: {created}")
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.utils import count_subquery
+from recipes.models import Favorite
+from recipes.models import Recipe
+from users.models import Subscribe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Сверка счетчиков рецептов, подписчиков и избранного "
+            "с фактическими данными")
+
+    def reconcile(self, queryset, counter, actual):
+        """Исправляет строки queryset, в которых counter
+        не совпадает с actual. Возвращает количество исправленных строк."""
+
+        return queryset.exclude(
+            **{counter: actual}
+        ).update(**{counter: actual})
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        counters = (
+            (User.objects, "recipes_count",
+             count_subquery(Recipe.objects, "author")),
+            (User.objects, "followers_count",
+             count_subquery(Subscribe.objects, "author")),
+            (Recipe.objects, "favorites_count",
+             count_subquery(Favorite.objects, "recipe")),
+        )
+
+        for queryset, counter, actual in counters:
+            fixed = self.reconcile(queryset.all(), counter, actual)
+            self.stdout.write(
+                f"{queryset.model.__name__}.{counter}: исправлено {fixed}"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Сверка счетчиков завершена"))
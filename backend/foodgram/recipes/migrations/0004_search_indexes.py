@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from foodgram.operations import PostgreSQLRunSQL
+
+FORWARD_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_like "
+    "ON recipes_ingredient (UPPER(name) varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_trgm "
+    "ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_name_upper_like "
+    "ON recipes_recipe (UPPER(name) varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_name_upper_trgm "
+    "ON recipes_recipe USING gin (UPPER(name) gin_trgm_ops)",
+)
+
+BACKWARD_SQL = (
+    "DROP INDEX IF EXISTS recipes_ingredient_name_upper_like",
+    "DROP INDEX IF EXISTS recipes_ingredient_name_upper_trgm",
+    "DROP INDEX IF EXISTS recipes_recipe_name_upper_like",
+    "DROP INDEX IF EXISTS recipes_recipe_name_upper_trgm",
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_updated_at'),
+    ]
+
+    operations = [
+        PostgreSQLRunSQL(FORWARD_SQL, BACKWARD_SQL),
+    ]
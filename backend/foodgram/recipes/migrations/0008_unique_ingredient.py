@@ -0,0 +1,61 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_into(model, owner, field, duplicate_ids, keep_id):
+    """Переносит строки с дубликатов на оставляемый ингредиент,
+    складывая количество при совпадении."""
+    for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+        kept = model.objects.filter(
+            **{owner: getattr(row, owner)}, ingredient_id=keep_id
+        ).first()
+        if kept is None:
+            row.ingredient_id = keep_id
+            row.save(update_fields=['ingredient'])
+            continue
+        setattr(kept, field, getattr(kept, field) + getattr(row, field))
+        kept.save(update_fields=[field])
+        row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    groups = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in groups:
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit'],
+            ).exclude(id=group['keep_id']).values_list('id', flat=True)
+        )
+        merge_into(IngredientAmount, 'recipe_id', 'amount',
+                   duplicate_ids, group['keep_id'])
+        merge_into(ShoppingListItem, 'user_id', 'total_amount',
+                   duplicate_ids, group['keep_id'])
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
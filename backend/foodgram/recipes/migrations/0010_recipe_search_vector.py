@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+from django.db import migrations
+
+from foodgram.operations import PostgreSQLRunSQL
+
+FORWARD_SQL = (
+    "ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector "
+    "tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector "
+    "ON recipes_recipe USING gin (search_vector)",
+)
+
+BACKWARD_SQL = (
+    "DROP INDEX IF EXISTS recipes_recipe_search_vector",
+    "ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector",
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_timelineentry'),
+    ]
+
+    operations = [
+        PostgreSQLRunSQL(FORWARD_SQL, BACKWARD_SQL),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+import time
+
+from django.db import migrations, models
+
+VERSION_NAMES = (
+    'recipes', 'tags', 'ingredients', 'authors', 'recipe_ingredients'
+)
+
+
+def fill_versions(apps, schema_editor):
+    Version = apps.get_model('recipes', 'Version')
+    now = time.time()
+
+    Version.objects.bulk_create(
+        [Version(name=name, value=now) for name in VERSION_NAMES],
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='название')),
+                ('value', models.FloatField(default=0, verbose_name='версия')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+        migrations.RunPython(fill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredientsChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.IntegerField(null=True, verbose_name='id рецепта')),
+                ('version', models.FloatField(db_index=True, verbose_name='версия')),
+            ],
+            options={
+                'verbose_name': 'Изменение ингредиентов рецепта',
+                'verbose_name_plural': 'Изменения ингредиентов рецептов',
+            },
+        ),
+    ]
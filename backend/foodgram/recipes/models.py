@@ -21,6 +21,12 @@ class Ingredient(models.Model):
         ordering = ("name",)
         verbose_name = "Ингридиент"
         verbose_name_plural = "Ингридиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient"
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -71,10 +77,25 @@ class Recipe(models.Model):
         upload_to="recipe_images/",
         verbose_name="изображение"
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="варианты изображения"
+    )
     pub_date = models.DateTimeField(
         verbose_name="дата публикации",
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name="дата изменения",
+        auto_now=True
+    )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="в избранном"
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -101,6 +122,12 @@ class Recipe(models.Model):
                 fields=("name", "author"),
                 name="unique_for_author",)
         ]
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"],
+                         name="recipe_pub_date_idx"),
+            models.Index(fields=["author", "-pub_date"],
+                         name="recipe_author_pub_date_idx"),
+        ]
 
     def __str__(self):
         return self.name[:20]
@@ -161,6 +188,10 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=["user", "recipe"],
                                     name="unique_favorite_recipes")
         ]
+        indexes = [
+            models.Index(fields=["recipe", "user"],
+                         name="favorite_recipe_user_idx")
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
@@ -187,6 +218,132 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=["user", "recipe"],
                                     name="unique_cart_user_recipes")
         ]
+        indexes = [
+            models.Index(fields=["recipe", "user"],
+                         name="cart_recipe_user_idx")
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
+
+
+class ShoppingListItem(models.Model):
+    """Модель сводного списка покупок: суммарное количество
+    ингредиента по всем рецептам в корзине пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="пользователь"
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="ингредиент"
+    )
+    total_amount = models.IntegerField(
+        verbose_name="количество"
+    )
+
+    class Meta:
+        verbose_name = "Сводный список покупок"
+        verbose_name_plural = "Сводные списки покупок"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ingredient"],
+                                    name="unique_shopping_list_item")
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.ingredient} {self.total_amount}"
+
+
+class TimelineEntry(models.Model):
+    """Модель ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта, дата публикации
+    хранится в строке для чтения ленты по индексу без обращения
+    к таблице рецептов."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="пользователь"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="автор"
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="рецепт"
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="дата публикации"
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты подписок"
+        verbose_name_plural = "Ленты подписок"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"],
+                                    name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-recipe"],
+                         name="timeline_user_pub_date_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.recipe}"
+
+
+class Version(models.Model):
+    """Версия таблицы или состояния пользователя: метка времени
+    последнего изменения. Обновляется в транзакции, изменяющей данные,
+    поэтому новая версия видна всем процессам одновременно с данными."""
+
+    name = models.CharField(
+        max_length=64,
+        primary_key=True,
+        verbose_name="название"
+    )
+    value = models.FloatField(
+        default=0,
+        verbose_name="версия"
+    )
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
+
+class RecipeIngredientsChange(models.Model):
+    """Запись журнала изменений ингредиентов рецептов. По журналу
+    процессы обновляют индекс поиска по имеющимся ингредиентам только
+    для измененных рецептов. Пустой recipe_id означает, что изменились
+    все рецепты и индекс нужно построить заново."""
+
+    recipe_id = models.IntegerField(
+        null=True,
+        verbose_name="id рецепта"
+    )
+    version = models.FloatField(
+        db_index=True,
+        verbose_name="версия"
+    )
+
+    class Meta:
+        verbose_name = "Изменение ингредиентов рецепта"
+        verbose_name_plural = "Изменения ингредиентов рецептов"
+
+    def __str__(self):
+        return f"{self.recipe_id} - {self.version}"
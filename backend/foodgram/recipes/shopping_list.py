@@ -0,0 +1,165 @@
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+
+from recipes.models import IngredientAmount
+from recipes.models import ShoppingCart
+from recipes.models import ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Возвращает количество ингредиентов рецепта
+    в виде словаря {id ингредиента: количество}."""
+
+    return dict(
+        IngredientAmount.objects.filter(
+            recipe_id=recipe_id
+        ).values_list("ingredient_id", "amount")
+    )
+
+
+def get_amounts_diff(old, new):
+    """Возвращает изменение количества ингредиентов между двумя
+    словарями {id ингредиента: количество}."""
+
+    return {
+        ingredient_id: new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        for ingredient_id in old.keys() | new.keys()
+    }
+
+
+@transaction.atomic
+def apply_amounts(user_ids, amounts):
+    """Прибавляет количества amounts к сводным спискам покупок
+    пользователей user_ids. Отрицательные значения уменьшают количество,
+    строки с нулевым количеством удаляются."""
+
+    amounts = {pk: amount for pk, amount in amounts.items() if amount}
+
+    if not amounts:
+        return
+
+    user_ids = list(user_ids)
+
+    if not user_ids:
+        return
+
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id,
+                          ingredient_id=ingredient_id,
+                          total_amount=0)
+         for user_id in user_ids
+         for ingredient_id in amounts],
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids,
+        ingredient_id__in=amounts
+    )
+    items.update(
+        total_amount=F("total_amount") + Case(
+            *[When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()],
+            output_field=IntegerField()
+        )
+    )
+    items.filter(total_amount__lte=0).delete()
+
+
+def get_recipes_amounts(recipe_ids):
+    """Возвращает суммарное количество ингредиентов нескольких рецептов
+    в виде словаря {id ингредиента: количество}."""
+
+    return dict(
+        IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values("ingredient_id").annotate(
+            total_amount=Sum("amount")
+        ).values_list("ingredient_id", "total_amount")
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    """Добавляет ингредиенты рецептов в сводный список пользователя."""
+
+    apply_amounts([user_id], get_recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Убирает ингредиенты рецептов из сводного списка пользователя."""
+
+    apply_amounts(
+        [user_id],
+        get_amounts_diff(get_recipes_amounts(recipe_ids), {})
+    )
+
+
+def add_recipe(user_id, recipe_id):
+    """Добавляет ингредиенты рецепта в сводный список пользователя."""
+
+    add_recipes(user_id, [recipe_id])
+
+
+def remove_recipe(user_id, recipe_id):
+    """Убирает ингредиенты рецепта из сводного списка пользователя."""
+
+    remove_recipes(user_id, [recipe_id])
+
+
+def get_cart_user_ids(recipe_id):
+    """Возвращает id пользователей, у которых рецепт в корзине."""
+
+    return ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list("user_id", flat=True)
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта в сводные списки
+    всех пользователей, у которых рецепт в корзине."""
+
+    apply_amounts(
+        get_cart_user_ids(recipe_id),
+        get_amounts_diff(old_amounts, new_amounts)
+    )
+
+
+def delete_recipe(recipe_id):
+    """Убирает ингредиенты удаляемого рецепта из сводных списков."""
+
+    change_recipe(recipe_id, get_recipe_amounts(recipe_id), {})
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Пересчитывает сводные списки покупок по корзинам. Возвращает
+    количество созданных строк."""
+
+    items = ShoppingListItem.objects.all()
+    carts = ShoppingCart.objects.filter(recipe__recipes__isnull=False)
+
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        carts = carts.filter(user_id__in=user_ids)
+
+    items.delete()
+    totals = carts.values(
+        "user_id",
+        ingredient_id=F("recipe__recipes__ingredient_id")
+    ).annotate(
+        total_amount=Sum("recipe__recipes__amount")
+    ).values_list("user_id", "ingredient_id", "total_amount")
+
+    created = ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id,
+                          ingredient_id=ingredient_id,
+                          total_amount=total_amount)
+         for user_id, ingredient_id, total_amount in totals.iterator()],
+        batch_size=1000
+    )
+
+    return len(created)
@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+
+from recipes import jobs
+from recipes.models import Recipe
+from recipes.models import TimelineEntry
+from users.models import Subscribe
+
+
+def is_fanned_out(followers_count):
+    """Возвращает True, если рецепты автора раскладываются по лентам
+    подписчиков. Рецепты авторов с большим числом подписчиков
+    читаются из таблицы рецептов при запросе ленты."""
+
+    return followers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков его автора."""
+
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        "author_id", "pub_date", "author__followers_count"
+    ).first()
+
+    if recipe is None or not is_fanned_out(
+        recipe["author__followers_count"]
+    ):
+        return
+
+    user_ids = Subscribe.objects.filter(
+        author_id=recipe["author_id"]
+    ).values_list("user_id", flat=True)
+    batch = []
+
+    for user_id in user_ids.iterator(chunk_size=settings.FEED_BATCH_SIZE):
+        batch.append(TimelineEntry(user_id=user_id,
+                                   author_id=recipe["author_id"],
+                                   recipe_id=recipe_id,
+                                   pub_date=recipe["pub_date"]))
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def schedule_fan_out(recipe_id):
+    """Ставит раскладку рецепта по лентам в очередь после фиксации
+    транзакции."""
+
+    jobs.schedule("recipe-feed", settings.FEED_WORKERS, fan_out, recipe_id)
+
+
+def add_author(user_id, author_id, followers_count):
+    """Добавляет в ленту пользователя последние рецепты автора
+    после подписки на него."""
+
+    if not is_fanned_out(followers_count):
+        return
+
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        "-pub_date", "-id"
+    ).values_list("id", "pub_date")[:settings.FEED_BACKFILL_SIZE]
+
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id,
+                       author_id=author_id,
+                       recipe_id=recipe_id,
+                       pub_date=pub_date)
+         for recipe_id, pub_date in recipes],
+        ignore_conflicts=True
+    )
+
+
+def remove_author(user_id, author_id):
+    """Удаляет рецепты автора из ленты пользователя после отписки."""
+
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def keyset_filter(before, date_field, id_field):
+    """Возвращает условие выборки строк, идущих после курсора before
+    в порядке убывания (дата публикации, id)."""
+
+    if before is None:
+        return Q()
+
+    pub_date, recipe_id = before
+
+    return Q(**{f"{date_field}__lt": pub_date}) | Q(
+        **{date_field: pub_date, f"{id_field}__lt": recipe_id}
+    )
+
+
+def get_feed(user_id, limit, before=None):
+    """Возвращает страницу ленты пользователя: список пар
+    (дата публикации, id рецепта) в порядке убывания длиной не более
+    limit + 1, чтобы вызывающий код мог определить наличие следующей
+    страницы. Объединяет записи из таблицы ленты с рецептами авторов,
+    которые не раскладываются по лентам."""
+
+    entries = TimelineEntry.objects.filter(
+        keyset_filter(before, "pub_date", "recipe_id"),
+        Exists(Subscribe.objects.filter(user_id=user_id,
+                                        author_id=OuterRef("author_id"))),
+        user_id=user_id,
+    ).order_by("-pub_date", "-recipe_id").values_list(
+        "pub_date", "recipe_id"
+    )[:limit + 1]
+
+    recipes = Recipe.objects.filter(
+        keyset_filter(before, "pub_date", "id"),
+        author__in=Subscribe.objects.filter(
+            user_id=user_id,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values("author_id"),
+    ).order_by("-pub_date", "-id").values_list("pub_date", "id")[:limit + 1]
+
+    return sorted(set(entries) | set(recipes), reverse=True)[:limit + 1]
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Пересоздает ленты пользователей user_ids или всех пользователей
+    по текущим подпискам. Возвращает количество созданных записей."""
+
+    subscriptions = Subscribe.objects.filter(
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+    )
+    entries = TimelineEntry.objects.all()
+
+    if user_ids is not None:
+        subscriptions = subscriptions.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+
+    entries.delete()
+
+    for user_id, author_id, followers_count in subscriptions.values_list(
+        "user_id", "author_id", "author__followers_count"
+    ).iterator():
+        add_author(user_id, author_id, followers_count)
+
+    return entries.count()
@@ -0,0 +1,228 @@
+import json
+import os
+import shutil
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.utils import bulk_insert_ignore
+from recipes.models import Ingredient
+from recipes.models import IngredientAmount
+from recipes.models import Recipe
+from recipes.models import Tag
+from users.models import User
+
+
+def recipe_to_row(recipe):
+    """Возвращает рецепт в виде словаря для строки NDJSON.
+    Автор, теги и ингредиенты указываются по естественным ключам."""
+
+    return {
+        "name": recipe.name,
+        "text": recipe.text,
+        "cooking_time": recipe.cooking_time,
+        "pub_date": recipe.pub_date.isoformat(),
+        "author": recipe.author.username,
+        "tags": [tag.slug for tag in recipe.tags.all()],
+        "ingredients": [
+            {
+                "name": item.ingredient.name,
+                "measurement_unit": item.ingredient.measurement_unit,
+                "amount": item.amount,
+            }
+            for item in recipe.recipes.all()
+        ],
+        "image": recipe.image.name,
+    }
+
+
+def iter_recipes(batch_size):
+    """Возвращает все рецепты со связями. Рецепты читаются
+    пачками по id, связи каждой пачки загружаются отдельными запросами."""
+
+    last_id = 0
+
+    while True:
+        recipes = list(
+            Recipe.objects.filter(id__gt=last_id)
+            .select_related("author")
+            .prefetch_related(
+                "tags",
+                Prefetch(
+                    "recipes",
+                    queryset=IngredientAmount.objects.select_related(
+                        "ingredient"
+                    )
+                ),
+            )
+            .order_by("id")[:batch_size]
+        )
+        if not recipes:
+            return
+        for recipe in recipes:
+            yield recipe
+        last_id = recipes[-1].id
+
+
+def copy_image_to(name, media_dir):
+    """Копирует файл изображения из хранилища в каталог media_dir."""
+
+    if not name or not default_storage.exists(name):
+        return
+    path = os.path.join(media_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with default_storage.open(name) as source, open(path, "wb") as target:
+        shutil.copyfileobj(source, target)
+
+
+def copy_image_from(name, media_dir):
+    """Копирует файл изображения из каталога media_dir в хранилище,
+    если его там еще нет."""
+
+    path = os.path.join(media_dir, name)
+    if default_storage.exists(name) or not os.path.isfile(path):
+        return
+    with open(path, "rb") as source:
+        default_storage.save(name, File(source))
+
+
+def resolve_ingredients(rows):
+    """Создает недостающие ингредиенты и возвращает словарь
+    {(название, единица измерения): id} для всех ингредиентов rows."""
+
+    keys = {
+        (item["name"], item["measurement_unit"])
+        for row in rows
+        for item in row["ingredients"]
+    }
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit) for name, unit in keys],
+        ignore_conflicts=True
+    )
+    found = Ingredient.objects.filter(
+        name__in={name for name, _ in keys}
+    ).values_list("name", "measurement_unit", "id")
+
+    return {(name, unit): pk for name, unit, pk in found}
+
+
+def filter_new_rows(rows, authors):
+    """Оставляет строки, у которых найден автор и нет рецепта
+    с тем же названием у этого автора. Строки с неизвестным автором
+    не импортируются и учитываются в отчете import_rows."""
+
+    rows = [row for row in rows if row["author"] in authors]
+    existing = set(
+        Recipe.objects.filter(
+            author__in=[authors[row["author"]] for row in rows],
+            name__in=[row["name"] for row in rows],
+        ).values_list("author_id", "name")
+    )
+    new_rows = {}
+    for row in rows:
+        key = (authors[row["author"]].id, row["name"])
+        if key not in existing:
+            new_rows.setdefault(key, row)
+
+    return new_rows
+
+
+def create_recipes(new_rows):
+    """Создает рецепты одним запросом INSERT ... ON CONFLICT DO NOTHING
+    и возвращает словарь {(id автора, название): id} только для
+    вставленных рецептов. Рецепт с тем же названием, одновременно
+    созданный другой пачкой при --workers, пропускается, а не прерывает
+    импорт. Дата публикации берется из строки."""
+
+    now = timezone.now()
+    inserted = bulk_insert_ignore(Recipe, [
+        {
+            "author": author_id,
+            "name": name,
+            "text": row["text"],
+            "cooking_time": row["cooking_time"],
+            "image": row["image"],
+            "image_variants": {},
+            "pub_date": parse_datetime(row["pub_date"]),
+            "updated_at": now,
+            "favorites_count": 0,
+        }
+        for (author_id, name), row in new_rows.items()
+    ], "id")
+    created = Recipe.objects.filter(id__in=inserted).values_list(
+        "author_id", "name", "id"
+    )
+
+    return {(author_id, name): pk for author_id, name, pk in created}
+
+
+def create_relations(new_rows, ids, tags, ingredients):
+    """Создает связи созданных рецептов с тегами и ингредиентами."""
+
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=pk, tag_id=tags[slug].id)
+        for key, pk in ids.items()
+        for slug in new_rows[key]["tags"]
+        if slug in tags
+    ], ignore_conflicts=True)
+    IngredientAmount.objects.bulk_create([
+        IngredientAmount(
+            recipe_id=pk,
+            ingredient_id=ingredients[
+                (item["name"], item["measurement_unit"])
+            ],
+            amount=item["amount"],
+        )
+        for key, pk in ids.items()
+        for item in new_rows[key]["ingredients"]
+    ], ignore_conflicts=True)
+
+
+def update_recipes_count(ids):
+    """Увеличивает счетчики рецептов авторов на число новых рецептов."""
+
+    counts = Counter(author_id for author_id, _ in ids)
+
+    for author_id, count in counts.items():
+        User.objects.filter(id=author_id).update(
+            recipes_count=F("recipes_count") + count
+        )
+
+
+@transaction.atomic
+def import_rows(rows, media_dir=None):
+    """Импортирует пачку строк NDJSON. Авторы, теги и ингредиенты
+    загружаются одним запросом на таблицу, рецепты и связи создаются
+    через bulk_create. Возвращает количество созданных рецептов
+    и количество пропущенных строк с неизвестным автором."""
+
+    rows = [json.loads(line) for line in rows if line.strip()]
+    authors = User.objects.in_bulk(
+        {row["author"] for row in rows}, field_name="username"
+    )
+    skipped = sum(row["author"] not in authors for row in rows)
+    new_rows = filter_new_rows(rows, authors)
+
+    if not new_rows:
+        return 0, skipped
+
+    tags = Tag.objects.in_bulk(
+        {slug for row in new_rows.values() for slug in row["tags"]},
+        field_name="slug"
+    )
+    ingredients = resolve_ingredients(new_rows.values())
+    ids = create_recipes(new_rows)
+    create_relations(new_rows, ids, tags, ingredients)
+    update_recipes_count(ids)
+
+    if media_dir:
+        for key in ids:
+            copy_image_from(new_rows[key]["image"], media_dir)
+
+    return len(ids), skipped
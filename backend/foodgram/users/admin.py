@@ -12,7 +12,8 @@ class UserAdmin(admin.ModelAdmin):
         "username",
         "password",
         "email",
-
+        "recipes_count",
+        "followers_count"
     )
     search_fields = (
         "username",
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from foodgram.operations import PostgreSQLRunSQL
+
+FORWARD_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS users_user_username_upper_trgm "
+    "ON users_user USING gin (UPPER(username) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS users_user_email_upper_trgm "
+    "ON users_user USING gin (UPPER(email) gin_trgm_ops)",
+)
+
+BACKWARD_SQL = (
+    "DROP INDEX IF EXISTS users_user_username_upper_trgm",
+    "DROP INDEX IF EXISTS users_user_email_upper_trgm",
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        PostgreSQLRunSQL(FORWARD_SQL, BACKWARD_SQL),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    User.objects.update(
+        recipes_count=Coalesce(Subquery(
+            Recipe.objects.filter(author=OuterRef('pk')).order_by()
+            .values('author').annotate(count=Count('id')).values('count')
+        ), 0),
+        followers_count=Coalesce(Subquery(
+            Subscribe.objects.filter(author=OuterRef('pk')).order_by()
+            .values('author').annotate(count=Count('id')).values('count')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_search_indexes'),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,16 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(max_length=254, unique=True)
+    recipes_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="количество рецептов"
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name="количество подписчиков"
+    )
 
     class Meta:
         ordering = ("id", )
@@ -1,14 +1,15 @@
-from django.db.models import Count
 from djoser.serializers import UserCreateSerializer
 from djoser.serializers import UserSerializer
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.metrics import MeasuredSerializerMixin
+from recipes.images import get_variant_urls
 from recipes.models import (Recipe)
 from users.models import User
 
 
-class UserGetSerializer(UserSerializer):
+class UserGetSerializer(MeasuredSerializerMixin, UserSerializer):
     """Сериализатор для пользователя, который возвращает
     дополнительное поле "is_subscribed",показывающее, подписан ли
     текущий пользователь на этого пользователя."""
@@ -92,9 +93,11 @@ class SetPasswordSerializer(serializers.Serializer):
         return validated_data
 
 
-class CustomRecipeSerializer(serializers.ModelSerializer):
+class CustomRecipeSerializer(MeasuredSerializerMixin,
+                             serializers.ModelSerializer):
     """Список рецептов без ингридиентов."""
     image = Base64ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
@@ -104,16 +107,27 @@ class CustomRecipeSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time"
         )
 
+    def get_image_variants(self, obj):
+        """Возвращает ссылки на уменьшенные копии изображения
+        в виде {размер: {формат: url}}."""
 
-class SubscriptionsGetSerializer(serializers.ModelSerializer):
+        return get_variant_urls(
+            obj.image_variants,
+            self.context.get("request")
+        )
+
+
+class SubscriptionsGetSerializer(MeasuredSerializerMixin,
+                                 serializers.ModelSerializer):
     """Серализатор для получения подписок пользователя"""
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -134,24 +148,20 @@ class SubscriptionsGetSerializer(serializers.ModelSerializer):
         subscriptions = self.context.get("subscriptions", set())
         return obj.id in subscriptions
 
-    def get_recipes_count(self, obj):
-        """Метод получает количество рецептов пользователя
-        и возвращает его в виде целого числа"""
-
-        qs = Recipe.objects.filter(author=obj).aggregate(count=Count("id"))
-
-        return qs["count"]
-
     def get_recipes(self, obj):
         """Метод для получения рецептов пользователя
-        и возврата их в сериализованном виде."""
+        и возврата их в сериализованном виде. Использует рецепты,
+        заранее подгруженные в latest_recipes, если они есть."""
 
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = obj.recipes.all()
+        if hasattr(obj, "latest_recipes"):
+            recipes = obj.latest_recipes
+        else:
+            request = self.context.get("request")
+            limit = request.GET.get("recipes_limit")
+            recipes = obj.recipes.all()
 
-        if limit:
-            recipes = recipes[:int(limit)]
+            if limit:
+                recipes = recipes[:int(limit)]
 
         serializer = CustomRecipeSerializer(
             recipes,
@@ -162,14 +172,15 @@ class SubscriptionsGetSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class SubscriptionsSerializer(serializers.ModelSerializer):
+class SubscriptionsSerializer(MeasuredSerializerMixin,
+                              serializers.ModelSerializer):
     """Сериализатор подписок пользователей."""
 
     email = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = CustomRecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -189,11 +200,3 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
 
         subscriptions = self.context.get("subscriptions", set())
         return obj.id in subscriptions
-
-    def get_recipes_count(self, obj):
-        """Метод получает количество рецептов пользователя
-        и возвращает его в виде целого числа"""
-
-        qs = Recipe.objects.filter(author=obj).aggregate(count=Count("id"))
-
-        return qs["count"]
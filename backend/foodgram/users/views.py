@@ -1,3 +1,6 @@
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins
 from rest_framework import status
@@ -7,7 +10,12 @@ from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api.cache import bump_user_version
 from api.pagination import CustomPaginator
+from api.pagination import UserCursorPaginator
+from api.utils import insert_ignore
+from api.utils import prefetch_latest_recipes
+from recipes import timeline
 from users.models import Subscribe
 from users.models import User
 from users.serializers import SetPasswordSerializer
@@ -26,6 +34,7 @@ class UserViewSet(mixins.CreateModelMixin,
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     pagination_class = CustomPaginator
+    cursor_pagination_class = UserCursorPaginator
 
     def get_serializer_class(self):
         """Возвращает класс сериализатора в зависимости от метода."""
@@ -95,10 +104,15 @@ class UserViewSet(mixins.CreateModelMixin,
             url_name="subscriptions")
     def subscriptions(self, request):
         """Возвращает список пользователей, на которых подписан
-        текущий пользователь."""
+        текущий пользователь. Последние recipes_limit рецептов всех
+        авторов страницы подгружаются одним запросом."""
+
+        limit = request.query_params.get("recipes_limit")
+        limit = int(limit) if limit and limit.isdigit() else None
 
         queryset = User.objects.filter(subscribing__user=request.user)
         page = self.paginate_queryset(queryset)
+        prefetch_latest_recipes(page, limit)
         serializer = SubscriptionsGetSerializer(page, many=True,
                                                 context={"request": request})
         return self.get_paginated_response(serializer.data)
@@ -112,26 +126,14 @@ class UserViewSet(mixins.CreateModelMixin,
         """Подписывает текущего пользователя на пользователя
         с id=kwargs["pk"], либо отписывает от него."""
 
-        author = get_object_or_404(User, id=kwargs["pk"])
-
-        if request.user == author:
+        if str(request.user.id) == kwargs["pk"]:
             return Response(
                 {"errors": "Нельзя подписаться/отписаться от/на самого себя"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        subscription = Subscribe.objects.filter(
-            author=author,
-            user=request.user
-        )
-
         if request.method == "POST":
-
-            if subscription.exists():
-                return Response(
-                    {"errors": "Нельзя подписаться повторно на автора"},
-                    status=status.HTTP_400_BAD_REQUEST)
-
+            author = get_object_or_404(User, id=kwargs["pk"])
             serializer = SubscriptionsSerializer(
                 author,
                 data=request.data,
@@ -140,7 +142,21 @@ class UserViewSet(mixins.CreateModelMixin,
 
             serializer.is_valid(raise_exception=True)
 
-            Subscribe.objects.create(user=request.user, author=author)
+            with transaction.atomic():
+                if not insert_ignore(Subscribe,
+                                     user=request.user,
+                                     author=author):
+                    return Response(
+                        {"errors": "Нельзя подписаться повторно на автора"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+                User.objects.filter(pk=author.pk).update(
+                    followers_count=F("followers_count") + 1
+                )
+                timeline.add_author(request.user.id, author.id,
+                                    author.followers_count + 1)
+
+            bump_user_version(request.user.id)
 
             return Response(
                 serializer.data,
@@ -148,10 +164,21 @@ class UserViewSet(mixins.CreateModelMixin,
             )
 
         if request.method == "DELETE":
-            get_object_or_404(
-                Subscribe,
-                user=request.user,
-                author=author).delete()
+            with transaction.atomic():
+                deleted, _ = Subscribe.objects.filter(
+                    user=request.user,
+                    author_id=kwargs["pk"]
+                ).delete()
+
+                if not deleted:
+                    raise Http404
+
+                User.objects.filter(pk=kwargs["pk"]).update(
+                    followers_count=F("followers_count") - 1
+                )
+                timeline.remove_author(request.user.id, kwargs["pk"])
+
+            bump_user_version(request.user.id)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 